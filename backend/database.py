@@ -1,16 +1,121 @@
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
-from sqlalchemy.pool import StaticPool
+from sqlalchemy.pool import AsyncAdaptedQueuePool, StaticPool
+import os
+import threading
+import time
+from dotenv import load_dotenv
 
-# SQLite database URL (using aiosqlite for async support)
-DATABASE_URL = "sqlite+aiosqlite:///./agriagent.db"
+load_dotenv()
+
+# Defaults to a local SQLite file; set DATABASE_URL to a postgres:// URL in production
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///./agriagent.db")
+
+# Pool sizing (ignored for in-memory SQLite, which needs a single shared connection)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+# SQL logging: off by default; DB_ECHO=1 logs statements, DB_ECHO=debug also logs rows
+DB_ECHO = os.getenv("DB_ECHO", "0").lower()
+
+
+def normalize_database_url(url: str) -> str:
+    """Map plain postgres/sqlite URLs (as given by hosting providers) onto async drivers."""
+    if url.startswith("postgres://"):
+        url = "postgresql://" + url[len("postgres://"):]
+    if url.startswith("postgresql://"):
+        url = "postgresql+asyncpg://" + url[len("postgresql://"):]
+    if url.startswith("sqlite://"):
+        url = "sqlite+aiosqlite://" + url[len("sqlite://"):]
+    return url
+
+
+class PoolMetrics:
+    """Connection checkout wait times, recorded by InstrumentedQueuePool."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.checkouts = 0
+            self.timeouts = 0
+            self.total_wait = 0.0
+            self.max_wait = 0.0
+
+    def record(self, wait: float, timed_out: bool = False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+                return
+            self.checkouts += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "avg_wait_ms": (self.total_wait / self.checkouts * 1000) if self.checkouts else 0.0,
+                "max_wait_ms": self.max_wait * 1000,
+            }
+
+
+pool_metrics = PoolMetrics()
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool that times how long each checkout waits for a free connection."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except Exception:
+            pool_metrics.record(time.perf_counter() - start, timed_out=True)
+            raise
+        pool_metrics.record(time.perf_counter() - start)
+        return conn
+
+
+def _engine_options(url) -> dict:
+    options = {"echo": "debug" if DB_ECHO == "debug" else DB_ECHO in ("1", "true", "yes")}
+    if url.get_backend_name() == "sqlite":
+        options["connect_args"] = {"check_same_thread": False}
+        if url.database in (None, "", ":memory:"):
+            # Every connection to :memory: is a separate database, so share one
+            options["poolclass"] = StaticPool
+            return options
+    else:
+        options["pool_pre_ping"] = True
+        options["pool_recycle"] = DB_POOL_RECYCLE
+    options.update(
+        poolclass=InstrumentedQueuePool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+    )
+    return options
+
+
+url = make_url(normalize_database_url(DATABASE_URL))
+engine = create_async_engine(url, **_engine_options(url))
+
+if url.get_backend_name() == "sqlite":
+    @event.listens_for(engine.sync_engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        # WAL lets readers proceed while a write is in progress
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA busy_timeout=5000")
+        cursor.close()
 
-engine = create_async_engine(
-    DATABASE_URL,
-    connect_args={"check_same_thread": False},
-    poolclass=StaticPool,
-    echo=True
-)
 AsyncSessionLocal = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
 Base = declarative_base()
 
@@ -18,3 +123,20 @@ Base = declarative_base()
 async def get_db():
     async with AsyncSessionLocal() as session:
         yield session
+
+def get_pool_status() -> dict:
+    """Pool occupancy plus checkout wait metrics, for /monitor/db"""
+    pool = engine.sync_engine.pool
+    status = {
+        "backend": url.get_backend_name(),
+        "pool": pool.__class__.__name__,
+        "checkout_wait": pool_metrics.snapshot(),
+    }
+    if isinstance(pool, AsyncAdaptedQueuePool):
+        status.update(
+            size=pool.size(),
+            checked_in=pool.checkedin(),
+            checked_out=pool.checkedout(),
+            overflow=pool.overflow(),
+        )
+    return status
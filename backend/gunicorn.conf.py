@@ -0,0 +1,40 @@
+"""
+Multi-worker deployment: gunicorn manages uvicorn workers.
+
+    gunicorn -c gunicorn.conf.py main:app
+
+The app is imported once in the master (preload_app), which also creates the
+tables, seeds the knowledge base and loads the price dataset (main.preload)
+before forking. Workers inherit that memory copy-on-write instead of each
+reading the CSV. Per-process caches stay per worker; set CACHE_URL to a Redis
+URL to share computed results such as forecasts between them.
+"""
+import gc
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+# cpu_count() reports the host's CPUs inside a container, not its CPU limit; size this to the limit
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+
+# Chat requests wait on several upstream APIs; keep the hard kill well past CHAT_DEADLINE_SECONDS
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+# Recycle workers now and then so slow leaks cannot accumulate (0 disables)
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "0"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "0"))
+
+accesslog = "-"
+errorlog = "-"
+
+
+def when_ready(server):
+    """Runs in the master after the app is imported and before the first fork."""
+    import main
+    main.preload()
+    # Move everything allocated so far into the permanent generation: the collector then never
+    # writes to those objects' headers in the workers, so their pages stay shared
+    gc.freeze()
+    server.log.info(f"Preloaded shared data; forking {server.num_workers} workers")
@@ -1,77 +1,159 @@
+# Imported first so STARTUP_PROFILE=1 can time every import that follows
+from utils.startup_profile import startup_profiler
 from fastapi import FastAPI
-from routes.upload import router as upload_router
+from routes.upload import router as upload_router, get_gemini_model
 from routes.auth import router as auth_router
-from routes.chat import router as chat_router
+from routes.chat import router as chat_router, get_chat_service
 from routes.forecast import router as forecast_router
+from routes.prices import router as prices_router
+from routes.monitor import router as monitor_router
 from database import Base, engine
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from contextlib import asynccontextmanager
+import asyncio
+import importlib
 import os
+import sys
 from dotenv import load_dotenv
 from services import forecast_service
+from services.query_log import query_logger, QUERY_LOG_ENABLED
+from services.knowledge_service import knowledge_retriever
+from utils.security import password_hasher
+from utils.loop_monitor import loop_monitor, LoopMonitorMiddleware, LOOP_MONITOR_ENABLED
+from utils.serialization import FastJSONResponse
+from utils.cache import shared_cache
 
 # Load environment variables
 load_dotenv()
 
-# Global variable to store locations (loaded once at startup)
-LOCATIONS_CACHE = None
+# Compress responses larger than GZIP_MIN_SIZE bytes; small bodies are not worth the CPU or the header
+GZIP_ENABLED = os.getenv("GZIP_ENABLED", "1").lower() in ("1", "true", "yes")
+GZIP_MIN_SIZE = int(os.getenv("GZIP_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+
+# Import the LLM/TTS SDKs in the background once the app is up, instead of on the first chat request
+WARM_SDKS = os.getenv("WARM_SDKS", "1").lower() in ("1", "true", "yes")
+
+def print_locations_summary():
+    locations = forecast_service.get_locations()
+    crops = {crop for districts in locations['crops'].values() for district_crops in districts.values() for crop in district_crops}
+    print(f"✅ Locations cache loaded successfully!")
+    print(f"   📍 States: {len(locations['states'])}")
+    print(f"   🏘️  Total Districts: {sum(len(d) for d in locations['districts'].values())}")
+    print(f"   🌾 Total Crops: {len(crops)}")
+    print(f"   ⚡ Ready for instant responses!")
+
+async def load_locations():
+    """Load the price dataset off the event loop; /forecast/locations/health reports 503 until it is ready"""
+    try:
+        print("📊 Loading locations data...")
+        with startup_profiler.phase("dataset"):
+            await asyncio.to_thread(forecast_service.preload)
+        print_locations_summary()
+    except Exception as e:
+        print(f"❌ Failed to load locations cache: {e}")
+
+def warm_sdks():
+    """Build the chat service (Gemini, OpenAI, googletrans), the upload Gemini model and import gTTS so no request pays for it"""
+    get_chat_service()
+    get_gemini_model()
+    importlib.import_module("gtts")
+
+async def warm_sdks_in_background():
+    try:
+        with startup_profiler.phase("warm_sdks"):
+            await asyncio.to_thread(warm_sdks)
+        print("🔥 AI SDKs loaded")
+    except Exception as e:
+        print(f"⚠️ Failed to warm AI SDKs: {e}")
+
+async def init_database():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    try:
+        await knowledge_retriever.seed_if_empty()
+    except Exception as e:
+        print(f"⚠️ Knowledge base seeding failed: {e}")
+
+def preload():
+    """
+    One-time setup run in the gunicorn master before workers are forked (see gunicorn.conf.py):
+    creates tables, seeds the knowledge base, loads the price dataset and imports the AI SDKs
+    so every worker shares them copy-on-write instead of loading them itself.
+    """
+    print("🚀 Preloading AgriAgent data before forking workers...")
+    async def setup():
+        await init_database()
+        # Connections must not be inherited by forked workers
+        await engine.dispose()
+    with startup_profiler.phase("database"):
+        asyncio.run(setup())
+    print("✅ Database initialized")
+    with startup_profiler.phase("dataset"):
+        forecast_service.preload()
+    print_locations_summary()
+    if WARM_SDKS:
+        with startup_profiler.phase("warm_sdks"):
+            warm_sdks()
+        print("🔥 AI SDKs loaded")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Startup - Load locations data once
-    global LOCATIONS_CACHE
     print("🚀 Starting AgriAgent API...")
     
-    # Initialize database first
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+    if LOOP_MONITOR_ENABLED:
+        loop_monitor.start()
+        print("🩺 Event loop monitor enabled")
+    
+    # Initialize database first (a no-op when the master already did it)
+    with startup_profiler.phase("database"):
+        await init_database()
     print("✅ Database initialized")
     
-    # Load locations data
+    # Build the knowledge base retrieval index
     try:
-        print("📊 Loading locations data at startup...")
-        df = forecast_service.load_dataset()
-        
-        print(f"🔄 Processing {len(df)} records...")
-        states = sorted(df['STATE'].unique())
-        
-        districts = {}
-        crops = {}
-        
-        for state in states:
-            state_df = df[df['STATE'] == state]
-            districts[state] = sorted(state_df['District Name'].unique())
-            crops[state] = {}
-            
-            for district in districts[state]:
-                district_df = state_df[state_df['District Name'] == district]
-                crops[state][district] = sorted(district_df['Commodity'].unique())
-        
-        LOCATIONS_CACHE = {
-            "states": states,
-            "districts": districts,
-            "crops": crops
-        }
-        
-        print(f"✅ Locations cache loaded successfully!")
-        print(f"   📍 States: {len(states)}")
-        print(f"   🏘️  Total Districts: {sum(len(d) for d in districts.values())}")
-        print(f"   🌾 Total Crops: {len(df['Commodity'].unique())}")
-        print(f"   ⚡ Ready for instant responses!")
-        
+        with startup_profiler.phase("knowledge_index"):
+            await knowledge_retriever.refresh()
+        print(f"📚 Knowledge index ready ({len(knowledge_retriever.index)} entries)")
     except Exception as e:
-        print(f"❌ Failed to load locations cache: {e}")
-        raise
+        print(f"⚠️ Knowledge index unavailable: {e}")
+    
+    if QUERY_LOG_ENABLED:
+        with startup_profiler.phase("query_log"):
+            await query_logger.start()
+        print("📝 Query log writer started")
+    
+    # Load locations data unless it was preloaded before fork
+    background = []
+    if forecast_service.is_ready():
+        print(f"⚡ Using preloaded locations data ({forecast_service.row_count} records)")
+    else:
+        background.append(asyncio.create_task(load_locations()))
+    
+    if WARM_SDKS and "google.generativeai" not in sys.modules:
+        background.append(asyncio.create_task(warm_sdks_in_background()))
+    
+    startup_profiler.mark_ready()
     
     yield
     
     # Shutdown cleanup
     print("🔄 Shutting down AgriAgent API...")
+    for task in background:
+        if not task.done():
+            task.cancel()
+    await shared_cache.close()
+    await query_logger.stop()
+    password_hasher.shutdown()
+    if loop_monitor.running:
+        await loop_monitor.stop()
 
 # Create FastAPI app with lifespan
 app = FastAPI(
     title="AgriAgent API",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse
 )
 
 app.add_middleware(
@@ -82,11 +164,19 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+if GZIP_ENABLED:
+    app.add_middleware(GZipMiddleware, minimum_size=GZIP_MIN_SIZE, compresslevel=GZIP_LEVEL)
+
+if LOOP_MONITOR_ENABLED:
+    app.add_middleware(LoopMonitorMiddleware, monitor=loop_monitor)
+
 # Include routers
 app.include_router(upload_router, prefix="/upload", tags=["Upload"])
 app.include_router(auth_router, prefix="/auth", tags=["Auth"])
 app.include_router(chat_router, prefix="/api", tags=["Chat"])
 app.include_router(forecast_router, prefix="/forecast", tags=["Forecast"])
+app.include_router(prices_router, prefix="/prices", tags=["Prices"])
+app.include_router(monitor_router, prefix="/monitor", tags=["Monitor"])
 
 @app.get("/")
 async def root():
@@ -95,9 +185,10 @@ async def root():
 # Export the cache for use in routes
 def get_locations_cache():
     """Get the pre-loaded locations cache"""
-    return LOCATIONS_CACHE
+    return forecast_service.get_locations()
 
 if __name__ == "__main__":
     import uvicorn
     port = int(os.environ.get("PORT", 8000))  # Render gives you $PORT
+    # Single process; use `gunicorn -c gunicorn.conf.py main:app` for multiple workers
     uvicorn.run("main:app", host="0.0.0.0", port=port, reload=False)
@@ -0,0 +1,17 @@
+from sqlalchemy import Column, Integer, String, Text, TIMESTAMP, JSON, func
+from sqlalchemy.dialects.postgresql import ARRAY
+from database import Base
+
+class KnowledgeEntry(Base):
+    __tablename__ = "knowledge_base"
+
+    id = Column(Integer, primary_key=True, index=True)
+    category = Column(String(100), index=True)  # 'pest', 'disease', 'crop', 'weather', 'soil'
+    title = Column(String(255))
+    content = Column(Text)
+    # TEXT[] on PostgreSQL (as in schema.sql), JSON list elsewhere
+    keywords = Column(JSON().with_variant(ARRAY(String), "postgresql"))
+    language = Column(String(10), default="en")
+    source = Column(String(255))
+    created_at = Column(TIMESTAMP, server_default=func.now())
+    updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now())
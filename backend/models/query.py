@@ -0,0 +1,28 @@
+from sqlalchemy import Column, Integer, String, Text, Float, TIMESTAMP, ForeignKey, func
+from database import Base
+
+class QueryLog(Base):
+    __tablename__ = "queries"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), index=True)
+    query_type = Column(String(20), nullable=False)  # 'chat', 'image', 'voice'
+    original_query = Column(Text, nullable=False)
+    translated_query = Column(Text)
+    response = Column(Text, nullable=False)
+    confidence_score = Column(Float)
+    language = Column(String(10))
+    created_at = Column(TIMESTAMP, server_default=func.now(), index=True)
+
+class ImageUpload(Base):
+    __tablename__ = "image_uploads"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), index=True)
+    query_id = Column(Integer, ForeignKey("queries.id", ondelete="CASCADE"))
+    filename = Column(String(255))
+    file_path = Column(Text)
+    file_size = Column(Integer)
+    disease_detected = Column(String(255))
+    confidence_score = Column(Float)
+    created_at = Column(TIMESTAMP, server_default=func.now())
@@ -1,16 +1,28 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
-from schemas.user import UserCreate, UserLogin, TokenResponse
-from services.auth_service import signup_user, login_user
+from schemas.user import UserCreate, UserLogin, TokenResponse, UserProfile, UserUpdate
+from services.auth_service import signup_user, login_user, update_user
+from utils.auth import get_current_user
+from utils.security import PasswordHasherBusy
 from database import get_db
 from fastapi import APIRouter
 
 router = APIRouter(tags=["Auth"])
 
+def raise_busy(e: PasswordHasherBusy):
+    raise HTTPException(
+        status_code=429,
+        detail="Too many authentication requests, please retry shortly",
+        headers={"Retry-After": str(e.retry_after)},
+    )
+
 @router.post("/signup", response_model=TokenResponse)
 async def signup(user: UserCreate, db: AsyncSession = Depends(get_db)):
   
-    result = await signup_user(db, user.username, user.password, user.language_preference)
+    try:
+        result = await signup_user(db, user.username, user.password, user.language_preference)
+    except PasswordHasherBusy as e:
+        raise_busy(e)
     
     if "error" in result:
         raise HTTPException(status_code=400, detail=result["error"])
@@ -18,7 +30,22 @@ async def signup(user: UserCreate, db: AsyncSession = Depends(get_db)):
 
 @router.post("/login", response_model=TokenResponse)
 async def login(user: UserLogin, db: AsyncSession = Depends(get_db)):
-    result = await login_user(db, user.username, user.password)
+    try:
+        result = await login_user(db, user.username, user.password)
+    except PasswordHasherBusy as e:
+        raise_busy(e)
     if "error" in result:
         raise HTTPException(status_code=401, detail=result["error"])
     return result
+
+
+@router.get("/me", response_model=UserProfile)
+async def me(current_user: UserProfile = Depends(get_current_user)):
+    return current_user
+
+@router.patch("/me", response_model=UserProfile)
+async def update_me(update: UserUpdate, current_user: UserProfile = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    result = await update_user(db, current_user.username, update.language_preference)
+    if "error" in result:
+        raise HTTPException(status_code=404, detail=result["error"])
+    return result
@@ -1,15 +1,44 @@
-from fastapi import APIRouter, Depends, HTTPException, Request
-from fastapi.responses import JSONResponse
-from typing import Dict, List
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import Response
+from typing import Optional
 from schemas.chat import ChatRequest
+from schemas.user import UserProfile
+from utils.auth import get_optional_user
 from services.chat_service import ChatService
+from services.query_log import query_logger
+from services.audio_store import audio_store, AUDIO_TTL
+from utils.serialization import negotiated_response, parse_fields, shape_response, include_field
+import asyncio
 import logging
+import threading
 
 router = APIRouter()
-chat_service = ChatService()
+
+# Built on first use (or warmed at startup) rather than at import: it pulls in the Gemini,
+# OpenAI, googletrans and gTTS SDKs
+_chat_service: Optional[ChatService] = None
+_chat_service_lock = threading.Lock()
+
+def get_chat_service() -> ChatService:
+    global _chat_service
+    if _chat_service is None:
+        with _chat_service_lock:
+            if _chat_service is None:
+                _chat_service = ChatService()
+    return _chat_service
+
+async def load_chat_service() -> ChatService:
+    """get_chat_service() for handlers: a cold build imports the SDKs in a thread, not on the event loop"""
+    return _chat_service or await asyncio.to_thread(get_chat_service)
 
 @router.post("/chat")
-async def chat_endpoint(chat_request: ChatRequest):
+async def chat_endpoint(
+    chat_request: ChatRequest,
+    request: Request,
+    user: Optional[UserProfile] = Depends(get_optional_user),
+    fields: Optional[str] = Query(None, description="Comma-separated response fields to return, e.g. response,recommendations,audio_url"),
+    lean: bool = Query(False, description="Drop sources and inline audio; fetch audio from audio_url instead")
+):
     """
     Process a chat message through the agricultural assistant pipeline.
     
@@ -18,20 +47,40 @@ async def chat_endpoint(chat_request: ChatRequest):
         "message": "How do I grow tomatoes?",
         "crop_name": "Tomato",
         "location": {"lat": 12.9716, "lng": 77.5946},  # Example: Bangalore
-        "language": "en"
+        "language": "en"  # optional; falls back to the user's stored preference
     }
+    
+    Send `Accept: application/msgpack` for a msgpack body. With `lean=true` or
+    `fields=...` that leaves out audio_response, speech is not synthesized
+    inline and `audio_url` points at GET /api/audio/{id} instead.
     """
     try:
         # Convert Pydantic model to dict for processing
         request_data = chat_request.dict()
         
+        selected = parse_fields(fields)
+        inline_audio = include_field("audio_response", selected, lean)
+        
         # Process the chat through our service
-        response = await chat_service.process_chat(request_data)
+        response = await (await load_chat_service()).process_chat(request_data, user=user, include_audio=inline_audio)
         
         if "error" in response:
             raise HTTPException(status_code=400, detail=response["error"])
+        
+        query_logger.log_chat(
+            user_id=user.id if user else None,
+            query=response.get("query", chat_request.message),
+            response=response.get("response", ""),
+            language=response.get("sources", {}).get("original_language"),
+            translated_query=response.get("sources", {}).get("translated_query"),
+            confidence=response.get("confidence")
+        )
             
-        return JSONResponse(content=response)
+        if not inline_audio:
+            response["audio_url"] = audio_store.url(
+                response.get("response"), response.get("sources", {}).get("original_language") or "en"
+            )
+        return negotiated_response(request, shape_response(response, selected, lean))
         
     except Exception as e:
         logging.error(f"Error in chat endpoint: {str(e)}")
@@ -44,5 +93,13 @@ async def chat_endpoint(chat_request: ChatRequest):
 async def detect_language_endpoint(request: Request):
     data = await request.json()
     text = data.get("text", "")
-    lang = await chat_service.detect_language(text)
+    lang = await (await load_chat_service()).detect_language(text)
     return {"language": lang}
+
+@router.get("/audio/{audio_id}")
+async def audio_endpoint(audio_id: str):
+    """MP3 for an audio_url handed out by a lean chat or upload response"""
+    audio = await audio_store.get(audio_id)
+    if audio is None:
+        raise HTTPException(status_code=404, detail="Audio not found or expired")
+    return Response(content=audio, media_type="audio/mpeg", headers={"Cache-Control": f"private, max-age={AUDIO_TTL}"})
@@ -1,105 +1,177 @@
-from fastapi import APIRouter, Query, HTTPException
+from fastapi import APIRouter, Query, HTTPException, Depends
+from fastapi.responses import JSONResponse
+from typing import Optional
+import asyncio
+import os
 from services import forecast_service
-from schemas.forecast import ForecastRequest, ForecastResponse, LocationInfo, PriceData
-import requests
-import pandas as pd
+from schemas.forecast import ForecastRequest, ForecastResponse, LocationInfo, PriceData, BacktestRequest, PriceIngestRequest
+from schemas.user import UserProfile
+from utils.auth import get_optional_user, get_admin
+from utils.cache import shared_cache
 
 router = APIRouter(tags=["Forecast"])
 
+# Forecasts only change when the dataset does, so workers share computed results
+FORECAST_CACHE_TTL = int(os.getenv("FORECAST_CACHE_TTL", "3600"))
+
+def forecast_cache_key(request: ForecastRequest) -> str:
+    # data_version is the length of the shared ingest log, so it changes on every ingest and means the
+    # same data in every worker (call forecast_service.refresh() first to catch up with other workers)
+    return (f"forecast:{forecast_service.data_version}:{request.state}:{request.district}:{request.crop}:"
+            f"{request.price_type.lower()}:{request.forecast_days}:{request.model}")
+
 @router.post("", response_model=ForecastResponse)
-async def get_forecast(request: ForecastRequest):
+async def get_forecast(request: ForecastRequest, user: Optional[UserProfile] = Depends(get_optional_user)):
+    if forecast_service.get_price_store() is None:
+        raise HTTPException(status_code=503, detail="Price data not loaded yet, please try again in a moment")
+    await forecast_service.refresh()
+    
+    cache_key = forecast_cache_key(request)
+    cached = await shared_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    
     try:
-        df = forecast_service.load_dataset()
-        
-        # Debug: Print available columns
-        print(f"Available columns: {list(df.columns)}")
-        
-        # Try district-level data first
-        data = df[(df['STATE'] == request.state) & (df['District Name'] == request.district) & (df['Commodity'] == request.crop)].copy()
+        # Try district-level data first (date, min_price, modal_price, max_price, sorted by date)
+        data = await asyncio.to_thread(forecast_service.series_frame, request.state, request.district, request.crop)
+        key = forecast_service.series_key(request.state, request.district, request.crop)
         if data.empty:
             # Fallback to state-level data if district not found
-            data = df[(df['STATE'] == request.state) & (df['Commodity'] == request.crop)].copy()
+            data = await asyncio.to_thread(forecast_service.series_frame, request.state, None, request.crop)
+            key = forecast_service.series_key(request.state, None, request.crop)
         if data.empty:
             raise ValueError(f"No data found for crop '{request.crop}' in state '{request.state}' and district '{request.district}'")
         
-        # Debug: Print columns in filtered data
-        print(f"Filtered data columns: {list(data.columns)}")
-        
-        # Rename columns to match your exact CSV structure
-        data = data.rename(columns={
-            'Price Date': 'date',
-            'Min_Price': 'min_price',
-            'Modal_Price': 'modal_price', 
-            'Max_Price': 'max_price',
-        })
-        
-        # Select and sort data
-        data = data[['date', 'min_price', 'modal_price', 'max_price']].sort_values('date')
-        
-        # Convert date column to datetime if it's not already
-        if data['date'].dtype == 'object':
-            data['date'] = pd.to_datetime(data['date'])
-        
         historical = [PriceData(
             date=row['date'].strftime('%Y-%m-%d'),
             min_price=float(row['min_price']),
             modal_price=float(row['modal_price']),
             max_price=float(row['max_price']),
             is_forecast=False
-        ) for _, row in data.iterrows()]
+        ) for _, row in data.tail(30).iterrows()]
         
-        forecast_data, metrics = forecast_service.generate_forecast(data, request.price_type.lower(), request.forecast_days)
+        forecast_data, metrics = await forecast_service.forecast(
+            data, request.price_type.lower(), request.forecast_days, key, request.model
+        )
         forecast = [PriceData(**item) for item in forecast_data]
         
         summary = {
             "trend": metrics.get("trend"), 
             "avg_price": metrics.get("avg_price"), 
             "volatility": metrics.get("volatility"), 
-            "mape": metrics.get("mape")
+            "mape": metrics.get("mape"),
+            "model": metrics.get("model")
         }
         
-        return ForecastResponse(
-            historical_data=historical[-30:],
+        response = ForecastResponse(
+            historical_data=historical,
             forecast_data=forecast,
             metrics=metrics,
             summary=summary
         )
+        await shared_cache.set(cache_key, response.model_dump(), FORECAST_CACHE_TTL)
+        return response
         
     except Exception as e:
         print(f"Forecast error: {str(e)}")
         # Return proper error response that matches the schema
         raise HTTPException(status_code=400, detail=str(e))
 
+@router.get("/models")
+async def forecast_models():
+    """Forecast models a request can ask for; "auto" uses each series' backtest winner"""
+    from services.forecasters import FORECASTERS, DEFAULT_MODEL
+    return {"models": ["auto", *FORECASTERS], "default": "auto", "fallback": DEFAULT_MODEL}
+
+@router.post("/backtest")
+async def backtest_models(request: BacktestRequest, admin: Optional[UserProfile] = Depends(get_admin)):
+    """
+    Rolling-origin backtest of every district series (or one state/crop) across all models,
+    run in parallel worker processes. Each series' winner is cached for "auto" forecasts.
+    """
+    if forecast_service.get_price_store() is None:
+        raise HTTPException(status_code=503, detail="Price data not loaded yet, please try again in a moment")
+    if request.price_type.lower() not in forecast_service.PRICE_COLUMNS:
+        raise HTTPException(status_code=400, detail=f"price_type must be one of {', '.join(forecast_service.PRICE_COLUMNS)}")
+    await forecast_service.refresh()
+    try:
+        return await forecast_service.run_backtest(
+            request.price_type.lower(),
+            models=request.models,
+            horizon=request.horizon,
+            origins=request.origins,
+            state=request.state,
+            crop=request.crop
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/ingest")
+async def ingest_prices(request: PriceIngestRequest, admin: Optional[UserProfile] = Depends(get_admin)):
+    """
+    Append new price rows (e.g. a day's mandi arrivals) without reloading the dataset.
+    Series aggregates update in O(new rows); other workers replay the rows from the shared
+    append file before their next price read.
+    """
+    if not forecast_service.is_ready():
+        raise HTTPException(status_code=503, detail="Price data not loaded yet, please try again in a moment")
+    rows = [row.model_dump() for row in request.rows]
+    return await asyncio.to_thread(forecast_service.append_prices, rows)
+
+@router.get("/stats")
+async def series_stats(state: str = Query(...), crop: str = Query(...), district: Optional[str] = Query(None),
+                       price_type: str = Query("modal_price")):
+    """Trend, recent average and volatility of a series from its running aggregates (state-level without district)"""
+    if not forecast_service.is_ready():
+        raise HTTPException(status_code=503, detail="Price data not loaded yet, please try again in a moment")
+    price_type = price_type.lower()
+    if price_type not in forecast_service.PRICE_COLUMNS:
+        raise HTTPException(status_code=400, detail=f"price_type must be one of {', '.join(forecast_service.PRICE_COLUMNS)}")
+    await forecast_service.refresh()
+    key = forecast_service.series_key(state, district, crop)
+    stats = await asyncio.to_thread(forecast_service.get_series_stats, key)
+    if stats is None:
+        raise HTTPException(status_code=404, detail=f"No data found for series '{key}'")
+    return {"series": key, "price_type": price_type, "data_version": forecast_service.data_version, **stats.summary(price_type)}
+
 # Ultra-fast locations endpoint using startup cache
 @router.get("/locations", response_model=LocationInfo)
 async def get_forecast_locations():
     """Get all available locations and crops - instant response!"""
-    # Import here to avoid circular imports
-    from main import get_locations_cache
-    
-    locations_cache = get_locations_cache()
+    await forecast_service.refresh()
+    locations_cache = forecast_service.get_locations()
     if locations_cache is None:
         raise HTTPException(status_code=503, detail="Location data not loaded yet, please try again in a moment")
     
     return LocationInfo(**locations_cache)
 
-# Optional: Health check endpoint to verify cache status
+# Readiness check: 503 until the dataset is loaded, so load balancers and
+# container health checks only route traffic to workers that can answer
 @router.get("/locations/health")
 async def locations_health():
     """Check if location cache is loaded and ready"""
-    from main import get_locations_cache
-    
-    locations_cache = get_locations_cache()
-    return {
-        "status": "ready" if locations_cache is not None else "loading",
-        "states_count": len(locations_cache["states"]) if locations_cache else 0,
-        "districts_count": sum(len(d) for d in locations_cache["districts"].values()) if locations_cache else 0,
-        "message": "Location data loaded and ready for instant responses" if locations_cache else "Still loading..."
+    locations_cache = forecast_service.get_locations()
+    ready = forecast_service.is_ready()
+    messages = {
+        "ready": "Location data loaded and ready for instant responses",
+        "failed": f"Loading location data failed: {forecast_service.load_error}",
     }
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={
+            "status": "ready" if ready else ("failed" if forecast_service.status == "failed" else "loading"),
+            "states_count": len(locations_cache["states"]) if locations_cache else 0,
+            "districts_count": sum(len(d) for d in locations_cache["districts"].values()) if locations_cache else 0,
+            "worker_pid": os.getpid(),
+            "cache_backend": shared_cache.name,
+            "message": messages.get(forecast_service.status, "Still loading...")
+        }
+    )
 
 @router.get("/reverse-geocode")
 async def reverse_geocode(lat: float = Query(...), lon: float = Query(...)):
     """Reverse geocode lat/lon to district and state using Nominatim."""
+    import requests
     try:
         url = f"https://nominatim.openstreetmap.org/reverse?lat={lat}&lon={lon}&format=json"
         headers = {
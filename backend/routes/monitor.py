@@ -0,0 +1,35 @@
+from fastapi import APIRouter, Depends
+from utils.loop_monitor import loop_monitor
+from database import get_pool_status
+from services.query_log import query_logger
+from utils.startup_profile import startup_profiler
+from utils.auth import get_admin
+
+# Reports include stack traces and server paths, and DELETE resets state: operators only
+router = APIRouter(tags=["Monitor"], dependencies=[Depends(get_admin)])
+
+@router.get("/loop")
+async def loop_report():
+    """Event-loop blocking report: lag stats and the worst offending stacks per route"""
+    return loop_monitor.report()
+
+@router.delete("/loop")
+async def reset_loop_report():
+    """Clear the aggregated offenders, e.g. before a load test"""
+    loop_monitor.reset()
+    return {"status": "reset"}
+
+@router.get("/db")
+async def db_pool_report():
+    """Database pool occupancy and connection checkout wait times"""
+    return get_pool_status()
+
+@router.get("/query-log")
+async def query_log_report():
+    """Write-behind query log: queue depth, batches written, drops and spills"""
+    return query_logger.report()
+
+@router.get("/startup")
+async def startup_report():
+    """Boot time against the budget, lifespan phase timings and (with STARTUP_PROFILE=1) the slowest imports"""
+    return startup_profiler.report()
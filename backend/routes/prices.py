@@ -0,0 +1,68 @@
+from fastapi import APIRouter, Query, HTTPException
+from fastapi.responses import StreamingResponse
+from datetime import date
+from typing import Optional
+import asyncio
+import os
+from dotenv import load_dotenv
+from services import forecast_service
+from utils.serialization import csv_chunks, ndjson_chunks
+
+load_dotenv()
+
+router = APIRouter(tags=["Prices"])
+
+# Rows per page when no limit is given, and the most a single request may ask for
+PRICES_PAGE_SIZE = int(os.getenv("PRICES_PAGE_SIZE", "1000"))
+PRICES_MAX_PAGE_SIZE = int(os.getenv("PRICES_MAX_PAGE_SIZE", "50000"))
+
+FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+def day_number(value: Optional[date]) -> Optional[int]:
+    return None if value is None else (value - date(1970, 1, 1)).days
+
+@router.get("")
+async def query_prices(
+    state: Optional[str] = Query(None),
+    district: Optional[str] = Query(None),
+    crop: Optional[str] = Query(None),
+    start: Optional[date] = Query(None, description="First date (inclusive), YYYY-MM-DD"),
+    end: Optional[date] = Query(None, description="Last date (inclusive), YYYY-MM-DD"),
+    interval: str = Query("day", description="Resample to day, week (from Monday) or month"),
+    format: str = Query("ndjson", description="ndjson or csv"),
+    limit: int = Query(PRICES_PAGE_SIZE, ge=1, le=PRICES_MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page")
+):
+    """
+    Price history per series (state, district, crop), resampled to day/week/month buckets with
+    the lowest min price, highest max price, mean and median ("modal") of modal prices and row count.
+    Rows are ordered by series then date; follow the X-Next-Cursor header for the next page.
+    """
+    store = forecast_service.get_price_store()
+    if store is None:
+        raise HTTPException(status_code=503, detail="Price data not loaded yet, please try again in a moment")
+    await forecast_service.refresh()
+    if interval not in store.INTERVALS:
+        raise HTTPException(status_code=400, detail=f"interval must be one of {', '.join(store.INTERVALS)}")
+    if format not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(FORMATS)}")
+    if start and end and start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    try:
+        rows, next_cursor = await asyncio.to_thread(
+            store.page, limit, cursor,
+            state=state, district=district, crop=crop,
+            start=day_number(start), end=day_number(end), interval=interval
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    headers = {"X-Row-Count": str(len(rows))}
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+    if format == "csv":
+        headers["Content-Disposition"] = 'attachment; filename="prices.csv"'
+        body = csv_chunks(rows, store.ROW_FIELDS)
+    else:
+        body = ndjson_chunks(rows)
+    return StreamingResponse(body, media_type=FORMATS[format], headers=headers)
@@ -1,15 +1,20 @@
 import asyncio
-from fastapi import UploadFile, File, Form, APIRouter
+from fastapi import UploadFile, File, Form, APIRouter, Depends, Query, Request
+from typing import Optional
 from io import BytesIO
 import base64
-import re
-import json
 from datetime import datetime
 import httpx
-from gtts import gTTS
-import google.generativeai as genai
 import os
+import threading
 from dotenv import load_dotenv
+from schemas.user import UserProfile
+from utils.auth import get_optional_user
+from services.query_log import query_logger
+from schemas.advisory import DiseaseAdvisory
+from services.audio_store import audio_store
+from utils.serialization import negotiated_response, parse_fields, shape_response, include_field
+from utils.structured_output import generate_structured, parse_partial_json, validate_structured, repair_missing_fields
 
 load_dotenv()
 
@@ -18,21 +23,35 @@ GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 NGROK_URL = os.getenv("NGROK_URL")
 WEATHER_API_KEY = os.getenv("WEATHER_API_KEY")
 HF_TOKEN = os.getenv("HF_TOKEN")
-genai.configure(api_key=GEMINI_API_KEY)
 API_URL=os.getenv("HF_API_URL")
 
+# google.generativeai is imported and configured on the first upload, not when the app boots
+_gemini_model = None
+_gemini_lock = threading.Lock()
+
+def get_gemini_model():
+    global _gemini_model
+    if _gemini_model is None:
+        with _gemini_lock:
+            if _gemini_model is None:
+                import google.generativeai as genai
+                genai.configure(api_key=GEMINI_API_KEY)
+                _gemini_model = genai.GenerativeModel("gemini-1.5-flash")
+    return _gemini_model
+
+async def load_gemini_model():
+    """get_gemini_model() for handlers: the first call imports the SDK in a thread, not on the event loop"""
+    return _gemini_model or await asyncio.to_thread(get_gemini_model)
+
 # -------------------------
 # TTS in-memory
 # -------------------------
-from io import BytesIO
-from gtts import gTTS
-import base64
-
 def generate_audio(text: str, language: str = "en") -> str:
     if not text.strip():
         return ""  # empty text, return empty string
 
     try:
+        from gtts import gTTS
         buf = BytesIO()
         tts = gTTS(text=text, lang=language)
         tts.write_to_fp(buf)
@@ -95,7 +114,10 @@ async def get_disease(file: UploadFile):
 
         return resp.json()
 
-def call_gemini(disease_result, weather_data, location, language):
+# Fields Gemini has to produce; the rest of DiseaseAdvisory is filled in from what we already know
+DISEASE_FIELDS = ["disease", "confidence", "description", "recommendations"]
+
+async def call_gemini(disease_result, weather_data, location, language):
     current_date = datetime.now().strftime("%Y-%m-%d")
     temperature = weather_data.get("main", {}).get("temp", 0)
     humidity = weather_data.get("main", {}).get("humidity", 0)
@@ -109,38 +131,40 @@ def call_gemini(disease_result, weather_data, location, language):
     Date: {current_date}
     Weather: {weather_desc}, Temperature: {temperature}°C, Humidity: {humidity}%
 
-    Please analyze the disease and weather conditions in the given language and return JSON in this exact format:
-    {{
-      "disease": "<disease name>",
-      "confidence": <float between 0-1>,
-      "description": "<short disease description>",
-      "recommendations": [
-        "Recommendation 1",
-        "Recommendation 2"
-      ],
-      "location": "{location}",
-      "date": "{current_date}",
-      "temperature": {temperature},
-      "humidity": {humidity},
-      "weather": "{weather_desc}"
-    }}
+    Please analyze the disease and weather conditions in the given language. Give the disease name,
+    your confidence between 0 and 1, a short disease description and practical recommendations.
     """
-    model = genai.GenerativeModel("gemini-1.5-flash")
-    response = model.generate_content(prompt)
-    raw_text = response.text
-
-    # Clean JSON
-    clean_text = re.sub(r"```(?:json)?\n?", "", raw_text).replace("```", "")
+    known = {"location": location, "date": current_date, "temperature": temperature, "humidity": humidity, "weather": weather_desc}
     try:
-        return json.loads(clean_text)
+        model = await load_gemini_model()
+        raw_text = await generate_structured(model, prompt, DiseaseAdvisory, fields=DISEASE_FIELDS)
     except Exception as e:
-        return {"error": "Invalid AI response", "raw": raw_text, "exception": str(e)}
+        return {"error": "Gemini API error", "exception": str(e)}
+
+    data = parse_partial_json(raw_text)
+    data = data if isinstance(data, dict) else {}
+    advisory, missing = validate_structured(DiseaseAdvisory, {**data, **known})
+    repairable = [field for field in missing if field in DISEASE_FIELDS]
+    if repairable:
+        patch = await repair_missing_fields(model, DiseaseAdvisory, data, repairable, task=prompt)
+        advisory, missing = validate_structured(DiseaseAdvisory, {**data, **patch, **known})
+    if advisory is None:
+        return {"error": "Invalid AI response", "raw": raw_text, "missing": missing}
+    return advisory.model_dump()
 
 # -------------------------
 # Endpoint
 # -------------------------
 @router.post("/")
-async def upload_crop_image(file: UploadFile = File(...), location: str = Form(...), language: str = Form(...)):
+async def upload_crop_image(
+    request: Request,
+    file: UploadFile = File(...),
+    location: str = Form(...),
+    language: str = Form(...),
+    user: Optional[UserProfile] = Depends(get_optional_user),
+    fields: Optional[str] = Query(None, description="Comma-separated response fields to return"),
+    lean: bool = Query(False, description="Drop sources and inline audio; fetch audio from audio_url instead")
+):
     # 1️⃣ Run disease detection and weather fetch in parallel
     disease_task = asyncio.create_task(get_disease(file))
     weather_task = asyncio.create_task(get_weather(location))
@@ -153,12 +177,25 @@ async def upload_crop_image(file: UploadFile = File(...), location: str = Form(.
         return weather_data
 
     # 2️⃣ Gemini depends on both results
-    gemini_data = call_gemini(disease_result, weather_data, location, language)
-
-    # 3️⃣ Generate audio (can later move to background task)
-    audio_b64 = generate_audio(gemini_data.get("description", "No description provided"), language)
-
-    return {
+    gemini_data = await call_gemini(disease_result, weather_data, location, language)
+
+    # 3️⃣ Generate audio inline, or leave it for GET /api/audio/{id} in lean mode
+    selected = parse_fields(fields)
+    inline_audio = include_field("audio_response", selected, lean)
+    description = gemini_data.get("description", "No description provided")
+    audio_b64 = await asyncio.to_thread(generate_audio, description, language) if inline_audio else None
+
+    query_logger.log_image(
+        user_id=user.id if user else None,
+        filename=file.filename,
+        response=gemini_data.get("description", "No description provided"),
+        language=language,
+        disease=gemini_data.get("disease"),
+        confidence=gemini_data.get("confidence"),
+        file_size=file.size
+    )
+
+    response = {
         "query": f"Disease prediction for uploaded crop image: {file.filename}",
         "response": gemini_data.get("description", "No description provided"),
         "confidence": gemini_data.get("confidence", 0),
@@ -170,3 +207,6 @@ async def upload_crop_image(file: UploadFile = File(...), location: str = Form(.
         "sources": None,
         "error": None
     }
+    if not inline_audio:
+        response["audio_url"] = audio_store.url(description, language)
+    return negotiated_response(request, shape_response(response, selected, lean))
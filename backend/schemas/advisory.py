@@ -0,0 +1,17 @@
+from pydantic import BaseModel, Field
+from typing import List, Optional
+
+class Advisory(BaseModel):
+    description: str = Field(..., description="Short 1-2 sentence summary of the problem and advice")
+    recommendations: List[str] = Field(default_factory=list, description="Clear, actionable recommendations")
+
+class DiseaseAdvisory(BaseModel):
+    disease: str = Field(..., description="Disease name")
+    confidence: float = Field(0.0, ge=0, le=1, description="Confidence between 0 and 1")
+    description: str = Field(..., description="Short disease description")
+    recommendations: List[str] = Field(default_factory=list, description="Treatment and prevention steps")
+    location: Optional[str] = None
+    date: Optional[str] = None
+    temperature: Optional[float] = None
+    humidity: Optional[float] = None
+    weather: Optional[str] = None
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Optional
 
 class ChatMessage(BaseModel):
     content: str
@@ -13,4 +13,4 @@ class ChatRequest(BaseModel):
     message: str = Field(..., description="The user's message/query")
     crop_name: str = Field(..., description="Name of the crop")
     location: Location = Field(..., description="User's location coordinates")
-    language: str = Field('en', description="Preferred response language")
+    language: Optional[str] = Field(None, description="Preferred response language; defaults to the user's stored preference")
@@ -1,5 +1,6 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
+from datetime import date
 
 class PriceData(BaseModel):
     date: str
@@ -20,7 +21,32 @@ class ForecastRequest(BaseModel):
     district: str
     crop: str
     price_type: str = "Modal_price"
-    forecast_days: int = 30
+    forecast_days: int = Field(30, ge=1, le=365)
+    # "auto" picks the series' backtest winner; or one of GET /forecast/models
+    model: str = "auto"
+
+class BacktestRequest(BaseModel):
+    price_type: str = "modal_price"
+    models: Optional[List[str]] = None
+    horizon: Optional[int] = Field(None, ge=1, le=90)
+    origins: Optional[int] = Field(None, ge=1, le=12)
+    state: Optional[str] = None
+    crop: Optional[str] = None
+
+class PriceRow(BaseModel):
+    state: str
+    district: str
+    market: Optional[str] = None
+    crop: str
+    variety: Optional[str] = None
+    grade: Optional[str] = None
+    date: date
+    min_price: float = Field(..., ge=0)
+    modal_price: float = Field(..., ge=0)
+    max_price: float = Field(..., ge=0)
+
+class PriceIngestRequest(BaseModel):
+    rows: List[PriceRow] = Field(..., min_length=1, max_length=10000)
 
 class ForecastResponse(BaseModel):
     historical_data: List[PriceData]
@@ -1,4 +1,5 @@
 from pydantic import BaseModel
+from typing import Optional
 
 class UserCreate(BaseModel):
     username: str
@@ -12,3 +13,11 @@ class UserLogin(BaseModel):
 class TokenResponse(BaseModel):
     access_token: str
     token_type: str = "bearer"
+
+class UserProfile(BaseModel):
+    id: int
+    username: str
+    language_preference: Optional[str] = "en"
+
+class UserUpdate(BaseModel):
+    language_preference: Optional[str] = None
@@ -0,0 +1,68 @@
+"""
+Login throughput benchmark: bcrypt on the event loop vs. the bounded hashing pool.
+
+Fires N concurrent password verifications and reports logins/sec plus the
+worst event-loop stall seen by a 10ms ticker running alongside (that stall
+is what chat/forecast requests would wait behind during a login burst).
+
+Usage (from backend/):
+    python scripts/bench_auth.py --logins 64 --rounds 12
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+async def ticker(stop: asyncio.Event, stalls: list):
+    interval = 0.01
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        stalls.append(time.perf_counter() - start - interval)
+
+
+async def run(label: str, verify, logins: int, password: str, hashed: str):
+    stop = asyncio.Event()
+    stalls: list = []
+    tick = asyncio.create_task(ticker(stop, stalls))
+    start = time.perf_counter()
+    results = await asyncio.gather(*(verify(password, hashed) for _ in range(logins)), return_exceptions=True)
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await tick
+    ok = sum(1 for r in results if not isinstance(r, Exception))
+    rejected = len(results) - ok
+    print(f"{label:<10} {ok / elapsed:8.1f} logins/s  elapsed={elapsed:6.2f}s  "
+          f"max loop stall={max(stalls, default=0) * 1000:7.1f}ms  rejected(429)={rejected}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=64)
+    parser.add_argument("--rounds", type=int, default=12)
+    args = parser.parse_args()
+
+    os.environ["BCRYPT_ROUNDS"] = str(args.rounds)
+    os.environ.setdefault("PASSWORD_HASH_QUEUE_LIMIT", str(args.logins))
+    from utils import security
+
+    password = "correct horse battery staple"
+    hashed = security.hash_password(password)
+
+    async def on_loop(plain, stored):
+        # What auth_service did before: synchronous bcrypt inside the handler
+        return security.verify_password(plain, stored)
+
+    print(f"{args.logins} concurrent logins, bcrypt rounds={args.rounds}, "
+          f"pool workers={security.PASSWORD_HASH_WORKERS}")
+    await run("on-loop", on_loop, args.logins, password, hashed)
+    await run("pool", security.verify_password_async, args.logins, password, hashed)
+    security.password_hasher.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
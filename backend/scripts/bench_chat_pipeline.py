@@ -0,0 +1,127 @@
+"""
+Chat pipeline latency benchmark with stubbed upstreams.
+
+Every network call in ChatService (geocode, weather, translation, Dhenu,
+Gemini, TTS) is replaced by a sleep drawn from a log-normal distribution with
+an occasional slow tail, so execution strategies and deadline budgets can be
+compared offline. Reports p50/p90/p99 latency, which path answered, and how
+often the pipeline had to degrade.
+
+Usage (from backend/):
+    python scripts/bench_chat_pipeline.py --requests 400 --concurrency 20 --scale 0.05
+    python scripts/bench_chat_pipeline.py --strategies sequential,hedged
+
+--scale shrinks every latency, budget and hedge delay by the same factor, so
+results keep their shape while the run finishes quickly.
+"""
+import argparse
+import asyncio
+import functools
+import os
+import random
+import statistics
+import sys
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+for key in ("GOOGLE_API_KEY", "DHENU_API_KEY", "SECRET_KEY"):
+    os.environ.setdefault(key, "bench")
+
+# (median seconds, log-normal sigma, tail probability, tail seconds)
+UPSTREAMS = {
+    "location": (0.25, 0.4, 0.02, 3.0),
+    "weather": (0.2, 0.4, 0.02, 3.0),
+    "dhenu": (1.8, 0.35, 0.08, 7.0),
+    "enhance": (0.9, 0.3, 0.04, 4.0),
+    "gemini": (1.2, 0.3, 0.04, 4.0),
+    "tts": (0.4, 0.3, 0.02, 3.0),
+}
+
+
+def make_stub(name: str, value, scale: float, rng: random.Random):
+    median, sigma, tail_p, tail = UPSTREAMS[name]
+
+    async def stub(*args, **kwargs):
+        delay = tail if rng.random() < tail_p else rng.lognormvariate(0, sigma) * median
+        await asyncio.sleep(delay * scale)
+        return value
+    return stub
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))]
+
+
+async def run_strategy(strategy: str, args) -> None:
+    from services import chat_service as module
+    from utils.deadline import Deadline, DEFAULT_STAGE_BUDGETS, CHAT_DEADLINE_SECONDS
+
+    rng = random.Random(args.seed)
+    module.Deadline = functools.partial(
+        Deadline,
+        total=CHAT_DEADLINE_SECONDS * args.scale,
+        budgets={stage: seconds * args.scale for stage, seconds in DEFAULT_STAGE_BUDGETS.items()},
+    )
+    module.CHAT_HEDGE_DELAY = 3.0 * args.scale
+    module.CHAT_PARALLEL_GRACE = 0.5 * args.scale
+
+    async def no_knowledge(query, k=None, crop=None):
+        return []
+    module.knowledge_retriever.search = no_knowledge
+
+    service = module.ChatService()
+    service.strategy = strategy
+    advisory = '{"description": "Water twice a week.", "recommendations": ["Mulch the beds"]}'
+    service.get_location_name = make_stub("location", "Mysore", args.scale, rng)
+    service.get_weather = make_stub("weather", {"main": {"temp": 28, "humidity": 60}}, args.scale, rng)
+    service.get_dhenu_response = make_stub("dhenu", "Water tomatoes twice a week and mulch.", args.scale, rng)
+    service.get_enhanced_response = make_stub("enhance", advisory, args.scale, rng)
+    service.get_gemini_response = make_stub("gemini", advisory, args.scale, rng)
+    service.text_to_speech = make_stub("tts", "", args.scale, rng)
+
+    request = {
+        "message": "How often should I water tomatoes?",
+        "crop_name": "Tomato",
+        "location": {"lat": 12.3, "lng": 76.6},
+        "language": "en",
+    }
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies, answered_by, degraded = [], Counter(), 0
+
+    async def one():
+        nonlocal degraded
+        async with semaphore:
+            loop = asyncio.get_running_loop()
+            start = loop.time()
+            response = await service.process_chat(dict(request))
+            latencies.append((loop.time() - start) / args.scale)
+            answered_by[response["sources"]["answered_by"]] += 1
+            degraded += bool(response["degraded_stages"])
+
+    await asyncio.gather(*(one() for _ in range(args.requests)))
+    print(
+        f"{strategy:<11} p50={statistics.median(latencies):5.2f}s  p90={percentile(latencies, 90):5.2f}s  "
+        f"p99={percentile(latencies, 99):5.2f}s  degraded={degraded / args.requests:6.1%}  "
+        f"answered_by={dict(answered_by)}"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--scale", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--strategies", default="sequential,parallel,hedged")
+    args = parser.parse_args()
+
+    import logging
+    logging.disable(logging.WARNING)
+    print(f"{args.requests} requests, concurrency {args.concurrency}, latencies in unscaled seconds")
+    for strategy in args.strategies.split(","):
+        await run_strategy(strategy.strip(), args)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
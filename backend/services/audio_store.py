@@ -0,0 +1,120 @@
+import asyncio
+import base64
+import binascii
+import hashlib
+import hmac
+import json
+import logging
+import os
+import time
+import zlib
+from io import BytesIO
+from typing import Dict, Optional, Tuple
+from cachetools import TTLCache
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# How long an audio_url stays valid, and how many clips (pending or synthesized) are kept
+AUDIO_TTL = int(os.getenv("AUDIO_TTL", "3600"))
+AUDIO_CACHE_SIZE = int(os.getenv("AUDIO_CACHE_SIZE", "512"))
+
+AUDIO_ROUTE = "/api/audio"
+
+# Audio ids are signed so any worker can trust (and regenerate) the text they carry. Without a key
+# no ids are issued or accepted: an unsigned id would let anyone run TTS on arbitrary text
+AUDIO_SIGNING_KEY = (os.getenv("AUDIO_SIGNING_KEY") or os.getenv("SECRET_KEY") or "").encode()
+
+
+def synthesize_mp3(text: str, lang: str) -> bytes:
+    from gtts import gTTS
+    buf = BytesIO()
+    gTTS(text=text, lang=lang).write_to_fp(buf)
+    return buf.getvalue()
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+class AudioStore:
+    """
+    Out-of-band audio for lean responses.
+
+    An audio id carries its own text, language and expiry (compressed and
+    HMAC-signed), so whichever worker receives GET /api/audio/{id} can
+    synthesize it; nothing has to be shared between workers. Speech is only
+    synthesized the first time a clip is fetched, so clients that never press
+    play never pay for TTS, and each worker keeps the MP3s it made, keyed by
+    content so the same advice in the same language shares one clip.
+    """
+
+    def __init__(self, maxsize: int = AUDIO_CACHE_SIZE, ttl: int = AUDIO_TTL, key: bytes = AUDIO_SIGNING_KEY):
+        self.ttl = ttl
+        self.key = key
+        if not key:
+            logger.warning("AUDIO_SIGNING_KEY and SECRET_KEY are unset: audio URLs are disabled")
+        self.clips: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    def _signature(self, payload: bytes) -> bytes:
+        return hmac.new(self.key, payload, hashlib.sha256).digest()[:16]
+
+    def register(self, text: Optional[str], lang: str = "en") -> Optional[str]:
+        if not self.key or not text or not text.strip():
+            return None
+        payload = zlib.compress(json.dumps([lang, text, int(time.time()) + self.ttl], ensure_ascii=False).encode())
+        return f"{_b64encode(payload)}.{_b64encode(self._signature(payload))}"
+
+    def url(self, text: Optional[str], lang: str = "en") -> Optional[str]:
+        audio_id = self.register(text, lang)
+        return f"{AUDIO_ROUTE}/{audio_id}" if audio_id else None
+
+    def decode(self, audio_id: str) -> Optional[Tuple[str, str]]:
+        """(text, lang) of a genuine, unexpired id; None otherwise"""
+        if not self.key:
+            return None
+        try:
+            encoded_payload, encoded_signature = audio_id.split(".")
+            payload = _b64decode(encoded_payload)
+            if not hmac.compare_digest(_b64decode(encoded_signature), self._signature(payload)):
+                return None
+            lang, text, expires = json.loads(zlib.decompress(payload))
+        except (ValueError, binascii.Error, zlib.error):
+            return None
+        return (text, lang) if expires >= time.time() else None
+
+    async def get(self, audio_id: str) -> Optional[bytes]:
+        """MP3 bytes for an audio id, or None if forged/expired or TTS failed"""
+        decoded = self.decode(audio_id)
+        if decoded is None:
+            return None
+        text, lang = decoded
+        clip_key = hashlib.sha256(f"{lang}:{text}".encode()).hexdigest()
+        audio = self.clips.get(clip_key)
+        if audio is not None:
+            return audio
+        lock = self._locks.setdefault(clip_key, asyncio.Lock())
+        try:
+            async with lock:
+                # Another request may have synthesized it while we waited
+                audio = self.clips.get(clip_key)
+                if audio is None:
+                    audio = await asyncio.to_thread(synthesize_mp3, text, lang)
+                    self.clips[clip_key] = audio
+            return audio
+        except Exception as e:
+            logger.error(f"Audio synthesis failed: {str(e)}")
+            return None
+        finally:
+            if not lock.locked():
+                self._locks.pop(clip_key, None)
+
+
+audio_store = AudioStore()
@@ -1,7 +1,7 @@
 from sqlalchemy.future import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from models.user import User
-from utils.security import hash_password, verify_password, create_access_token
+from utils.security import hash_password_async, verify_password_async, create_access_token
 
 async def signup_user(db: AsyncSession, username: str, password: str, language: str):
     result = await db.execute(select(User).where(User.username == username))
@@ -9,7 +9,7 @@ async def signup_user(db: AsyncSession, username: str, password: str, language:
     if user:
         return {"error": "User already exists"}
 
-    hashed_password = hash_password(password)
+    hashed_password = await hash_password_async(password)
     new_user = User(username=username, password_hash=hashed_password, language_preference=language)
     db.add(new_user)
     await db.commit()
@@ -21,8 +21,29 @@ async def signup_user(db: AsyncSession, username: str, password: str, language:
 async def login_user(db: AsyncSession, username: str, password: str):
     result = await db.execute(select(User).where(User.username == username))
     user = result.scalar_one_or_none()
-    if not user or not verify_password(password, user.password_hash):
+    if not user:
         return {"error": "Invalid credentials"}
 
+    valid, new_hash = await verify_password_async(password, user.password_hash)
+    if not valid:
+        return {"error": "Invalid credentials"}
+    if new_hash:
+        # Stored hash predates the current BCRYPT_ROUNDS; upgrade it in place
+        user.password_hash = new_hash
+        await db.commit()
+
     token = create_access_token({"sub": user.username})
     return {"access_token": token, "token_type": "bearer"}
+
+
+async def update_user(db: AsyncSession, username: str, language: str = None):
+    result = await db.execute(select(User).where(User.username == username))
+    user = result.scalar_one_or_none()
+    if not user:
+        return {"error": "User not found"}
+
+    if language:
+        user.language_preference = language
+    await db.commit()
+
+    return {"id": user.id, "username": user.username, "language_preference": user.language_preference}
@@ -1,17 +1,18 @@
 import os
-from googletrans import Translator
-import google.generativeai as genai
-from openai import OpenAI
 from typing import Dict, List, Optional
 import logging
 from dotenv import load_dotenv
-import requests
-from gtts import gTTS
+import httpx
+from cachetools import TTLCache
 import asyncio  
 from io import BytesIO
 import base64
-import json
-import re
+import time
+from utils.language import resolve_language, normalize_language
+from services.knowledge_service import knowledge_retriever, format_knowledge
+from utils.deadline import Deadline, LatencyTracker
+from utils.structured_output import StructuredStream, generate_structured, parse_partial_json, validate_structured, repair_missing_fields
+from schemas.advisory import Advisory
 # Load environment variables
 load_dotenv()
 
@@ -19,19 +20,46 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Last good weather per ~1km cell, served when the live fetch misses its budget
+WEATHER_CACHE_TTL = int(os.getenv("WEATHER_CACHE_TTL", "21600"))
+
+# sequential: Dhenu then Gemini reformatting (default)
+# parallel:   Gemini answers directly while Dhenu runs; first valid wins, Dhenu preferred within a grace window
+# hedged:     a direct Gemini backup starts once Dhenu exceeds its recent latency percentile
+CHAT_EXECUTION_STRATEGY = os.getenv("CHAT_EXECUTION_STRATEGY", "sequential")
+CHAT_PARALLEL_GRACE = float(os.getenv("CHAT_PARALLEL_GRACE", "0.5"))
+CHAT_HEDGE_PERCENTILE = float(os.getenv("CHAT_HEDGE_PERCENTILE", "90"))
+# Hedge delay used until enough Dhenu latencies have been observed
+CHAT_HEDGE_DELAY = float(os.getenv("CHAT_HEDGE_DELAY", "3.0"))
+
 class ChatService:
+    TIMEOUT_MESSAGE = "I'm sorry, the advisory service is taking too long to respond. Please try again shortly."
+    DHENU_ERROR_MESSAGE = "I apologize, but I'm having trouble connecting to the Dhenu AI assistant."
+
     def __init__(self):
+        # The SDKs take well over a second to import, so they load with the first ChatService
+        # (built lazily by routes/chat.py, or warmed in the background at startup)
+        from googletrans import Translator
+        import google.generativeai as genai
+        from openai import AsyncOpenAI
+        
         self.translator = Translator()
         
         # Configure Gemini
         genai.configure(api_key=os.getenv('GOOGLE_API_KEY'))
         self.gemini_model = genai.GenerativeModel('gemini-2.0-flash-exp')
         
-        # Initialize Dhenu AI client
-        self.dhenu_client = OpenAI(
+        # Initialize Dhenu AI client (async, so a stage timeout can cancel it)
+        self.dhenu_client = AsyncOpenAI(
             base_url="https://api.dhenu.ai/v1",
             api_key=os.getenv('DHENU_API_KEY')
         )
+        
+        self.weather_cache = TTLCache(maxsize=4096, ttl=WEATHER_CACHE_TTL)
+        
+        # How Dhenu and Gemini are combined: sequential, parallel or hedged
+        self.strategy = CHAT_EXECUTION_STRATEGY
+        self.dhenu_latency = LatencyTracker()
 
     async def detect_language(self, text: str) -> str:
         """Detect the language of the given text"""
@@ -63,24 +91,29 @@ class ChatService:
             logger.error(f"Translation error: {str(e)}")
             return text  # Return original text if translation fails
 
-    async def get_gemini_response(self, prompt: str, context: Dict) -> str:
-        """Get response from Gemini model"""
+    async def get_gemini_response(self, prompt: str, context: Dict, lang: str = 'en', stream: Optional[StructuredStream] = None) -> str:
+        """Get a direct advisory from Gemini (no Dhenu advice), in the same JSON shape as get_enhanced_response"""
         try:
             # Prepare context for the prompt
             weather = context.get('weather', {})
             weather_str = self.format_weather(weather)
+            knowledge_str = f"\nReference notes:\n{format_knowledge(context['knowledge'])}\n" if context.get('knowledge') else ""
             context_str = f"""
+            You are an agricultural expert assistant.
             Context:
             - Crop: {context.get('crop_name', 'Not specified')}
             - Location: {context.get('location', 'Not specified')}
             - Weather: {weather_str}
             - Previous messages: {len(context.get('messages', []))} messages
-            
+            {knowledge_str}
             Question: {prompt}
+            Lang: {lang}
+            
+            Answer in the given language with a short 1-2 sentence "description" and 2-4 actionable "recommendations".
+            Keep it farmer-friendly and specific to the crop and location.
             """
             
-            response = await self.gemini_model.generate_content_async(context_str)
-            return response.text
+            return await generate_structured(self.gemini_model, context_str, Advisory, stream)
         except Exception as e:
             logger.error(f"Gemini API error: {str(e)}")
             return "I'm sorry, I encountered an error processing your request with Gemini."
@@ -98,6 +131,8 @@ class ChatService:
             - Weather: {weather_str}
             - Previous messages: {len(context.get('messages', []))} messages
             """
+            if context.get('knowledge'):
+                context_str += f"\nReference notes (prefer these where relevant):\n{format_knowledge(context['knowledge'])}\n"
             
             # Format messages for Dhenu AI
             messages = [{"role": "system", "content": f"You are an agricultural assistant. {context_str}"}]
@@ -106,7 +141,7 @@ class ChatService:
             # Add the current user message
             messages.append({"role": "user", "content": prompt})
             # Call Dhenu AI
-            response = self.dhenu_client.chat.completions.create(
+            response = await self.dhenu_client.chat.completions.create(
                 model="dhenu2-in-8b-preview",
                 messages=messages,
                 temperature=0.7,
@@ -115,14 +150,15 @@ class ChatService:
             return response.choices[0].message.content.strip()
         except Exception as e:
             logger.error(f"Dhenu AI API error: {str(e)}")
-            return "I apologize, but I'm having trouble connecting to the Dhenu AI assistant."
+            return self.DHENU_ERROR_MESSAGE
 
-    async def get_enhanced_response(self, prompt: str, dhenu_response: str, context: Dict, lang: str) -> str:
+    async def get_enhanced_response(self, prompt: str, dhenu_response: str, context: Dict, lang: str, stream: Optional[StructuredStream] = None) -> str:
         """Get enhanced, structured response from Gemini using Dhenu's advice as context"""
         try:
         # Prepare weather string
             weather = context.get('weather', {})
             weather_str = self.format_weather(weather)
+            knowledge_str = f"**Reference Notes:**\n{format_knowledge(context['knowledge'])}\n" if context.get('knowledge') else ""
 
         # Enhanced structured prompt
             enhanced_prompt = f"""
@@ -136,7 +172,7 @@ Your task is to rewrite it into a **concise, actionable, and easy-to-follow** JS
 - Crop: {context.get('crop_name', 'Not specified')}
 - Location: {context.get('location', 'Not specified')}
 - Weather: {weather_str}
-
+{knowledge_str}
 **Dhenu AI's Advice:**
 {dhenu_response}
 
@@ -160,8 +196,8 @@ Return only valid JSON in this exact format and in the given language:
 - Do not include any text outside of the JSON.
 """
 
-            response = await self.gemini_model.generate_content_async(enhanced_prompt)
-            return response.text.strip()
+            # JSON mode + response schema, streamed so a timeout still leaves the fields received so far
+            return await generate_structured(self.gemini_model, enhanced_prompt, Advisory, stream)
     
         except Exception as e:
             logger.error(f"Error getting enhanced response: {str(e)}")
@@ -174,7 +210,8 @@ Return only valid JSON in this exact format and in the given language:
             headers = {
                 "User-Agent": "AgriAgent/1.0 (your-email@example.com)"
             }
-            response = requests.get(url, headers=headers)
+            async with httpx.AsyncClient(timeout=10) as client:
+                response = await client.get(url, headers=headers)
             response.raise_for_status()
             data = response.json()
             
@@ -192,18 +229,26 @@ Return only valid JSON in this exact format and in the given language:
             if not WEATHER_API_KEY:
                 logger.error("WEATHER_API_KEY not set in environment.")
                 return {"error": "Weather API key not configured."}
-            import httpx
             url = f"https://api.openweathermap.org/data/2.5/weather?lat={lat}&lon={lng}&appid={WEATHER_API_KEY}&units=metric"
             async with httpx.AsyncClient(timeout=10) as client:
                 resp = await client.get(url)
                 if resp.status_code != 200:
                     logger.error(f"Weather API error: {resp.text}")
                     return {"error": "Weather API error", "details": resp.text}
-                return resp.json()
+                weather = resp.json()
+                self.weather_cache[self.weather_cache_key(lat, lng)] = weather
+                return weather
         except Exception as e:
             logger.error(f"Exception fetching weather: {str(e)}")
             return {"error": "Exception fetching weather", "details": str(e)}
 
+    def weather_cache_key(self, lat: float, lng: float) -> str:
+        return f"{round(lat, 2)},{round(lng, 2)}"
+
+    def cached_weather(self, lat: float, lng: float) -> dict:
+        """Last weather fetched near these coordinates, if still fresh enough to use"""
+        return self.weather_cache.get(self.weather_cache_key(lat, lng)) or {"error": "Weather unavailable"}
+
     def format_weather(self, weather: dict) -> str:
         """Format weather dictionary into a readable string for context."""
         if not weather or 'error' in weather:
@@ -219,17 +264,175 @@ Return only valid JSON in this exact format and in the given language:
         if not text.strip():
             return ""  # empty text, return empty string
         try:
-            buf = BytesIO()
-            tts = gTTS(text=text, lang=lang)
-            tts.write_to_fp(buf)
-            buf.seek(0)  # important: rewind to start before reading
-            audio_b64 = base64.b64encode(buf.read()).decode("utf-8")
-            return audio_b64
+            # gTTS is blocking network I/O; keep it off the event loop
+            return await asyncio.to_thread(self._synthesize_speech, text, lang)
         except Exception as e:
             print("TTS generation error:", e)
             return ""
 
-    async def process_chat(self, request_data: Dict) -> Dict:
+    def _synthesize_speech(self, text: str, lang: str) -> str:
+        from gtts import gTTS
+        buf = BytesIO()
+        tts = gTTS(text=text, lang=lang)
+        tts.write_to_fp(buf)
+        buf.seek(0)  # important: rewind to start before reading
+        return base64.b64encode(buf.read()).decode("utf-8")
+
+    async def translate_advisory(self, advisory: Dict, target_lang: str) -> Dict:
+        """Translate an English description/recommendations advisory into the user's language"""
+        if target_lang == 'en':
+            return advisory
+        texts = [advisory.get("description", "")] + list(advisory.get("recommendations", []))
+        translated = await asyncio.gather(*(self.translate_text(text, target_lang, 'en') for text in texts))
+        return dict(advisory, description=translated[0], recommendations=list(translated[1:]))
+
+    async def resolve_language(self, text: str, requested: Optional[str] = None, preferred: Optional[str] = None):
+        """Language of the message from request/profile hints and script, detecting remotely only if unsure"""
+        language, source = resolve_language(text, requested, preferred)
+        if language is None:
+            language, source = await self.detect_language(text), "detected"
+        return language, source
+
+    async def complete_advisory(self, text: Optional[str], question: str, lang: str, deadline: Deadline) -> Optional[Dict]:
+        """
+        Validated advisory from an LLM's (possibly partial) JSON reply, or None if it has no usable description.
+        Missing recommendations are fetched with a small targeted repair call if time allows.
+        """
+        advisory, missing = validate_structured(Advisory, parse_partial_json(text))
+        if advisory is None:
+            return None
+        if "recommendations" in missing and deadline.remaining() > 0:
+            patch = await deadline.run(
+                "repair",
+                repair_missing_fields(
+                    self.gemini_model, Advisory, advisory.model_dump(), ["recommendations"],
+                    task=f"Agricultural question: {question}\nAnswer language: {lang}"
+                ),
+                fallback={}
+            )
+            advisory = advisory.model_copy(update=patch)
+        return advisory.model_dump()
+
+    async def run_dhenu_chain(self, user_message_en: str, context: Dict, original_language: str, deadline: Deadline,
+                              dhenu_answered: Optional[asyncio.Event] = None) -> Dict:
+        """
+        Dhenu's advice, reformatted by Gemini (and translated back in parallel).
+        `dhenu_answered` is set as soon as the Dhenu call itself returns.
+        """
+        started = time.perf_counter()
+        try:
+            dhenu_response = await deadline.run("dhenu", self.get_dhenu_response(user_message_en, context))
+        finally:
+            # Only the Dhenu call, and also when a winning hedge cancels it: dropping those slow
+            # samples would drag the percentile down and make the hedge fire ever earlier
+            self.dhenu_latency.record(time.perf_counter() - started)
+        if dhenu_answered is not None:
+            dhenu_answered.set()
+        if dhenu_response is None or dhenu_response == self.DHENU_ERROR_MESSAGE:
+            return {"valid": False, "dhenu_advice": dhenu_response}
+        
+        # Translate back
+        stream = StructuredStream()
+        if original_language != 'en':
+            final_response, dhenu_advice_translated = await asyncio.gather(
+                deadline.run("enhance", self.get_enhanced_response(user_message_en, dhenu_response, context, original_language, stream)),
+                deadline.run("translate_back", self.translate_text(dhenu_response, original_language, 'en'), fallback=dhenu_response)
+            )
+        else:
+            final_response = await deadline.run("enhance", self.get_enhanced_response(user_message_en, dhenu_response, context, original_language, stream))
+            dhenu_advice_translated = dhenu_response
+        
+        # On timeout, salvage whatever part of the JSON had streamed in
+        advisory = await self.complete_advisory(
+            final_response if final_response is not None else stream.text, user_message_en, original_language, deadline
+        )
+        if advisory is not None:
+            return {"valid": True, "advisory": advisory, "dhenu_advice": dhenu_advice_translated, "answered_by": "dhenu+gemini"}
+        if final_response is not None:
+            logger.error(f"Gemini did not return valid JSON: {final_response}")
+        # No usable reformatting (timed out or malformed); Dhenu's advice is still a usable answer
+        return {
+            "valid": True,
+            "advisory": {"description": dhenu_advice_translated, "recommendations": []},
+            "dhenu_advice": dhenu_advice_translated,
+            "answered_by": "dhenu",
+        }
+
+    async def run_gemini_direct(self, user_message_en: str, context: Dict, original_language: str, deadline: Deadline) -> Dict:
+        """Gemini answering on its own, used as the racing/hedging alternative to the Dhenu chain"""
+        stream = StructuredStream()
+        text = await deadline.run("gemini", self.get_gemini_response(user_message_en, context, original_language, stream))
+        advisory = await self.complete_advisory(
+            text if text is not None else stream.text, user_message_en, original_language, deadline
+        )
+        return {"valid": advisory is not None, "advisory": advisory, "answered_by": "gemini"}
+
+    async def first_valid(self, tasks: List[asyncio.Task], preferred: Optional[asyncio.Task] = None, grace: float = 0.0) -> Optional[Dict]:
+        """
+        Result of the first task to finish with a valid advisory; losers are cancelled.
+        If another task wins first, `preferred` still gets `grace` seconds to finish and take over.
+        """
+        pending = set(tasks)
+        invalid = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    result = task.result() if task.exception() is None else {"valid": False}
+                    if not result["valid"]:
+                        invalid = invalid or result
+                        continue
+                    if preferred is not None and preferred in pending and grace > 0:
+                        await asyncio.wait({preferred}, timeout=grace)
+                        if preferred.done() and preferred.exception() is None and preferred.result()["valid"]:
+                            return preferred.result()
+                    return result
+            return invalid
+        finally:
+            losers = [task for task in tasks if not task.done()]
+            for task in losers:
+                task.cancel()
+            await asyncio.gather(*losers, return_exceptions=True)
+
+    async def generate_advisory(self, user_message_en: str, context: Dict, original_language: str, deadline: Deadline) -> Dict:
+        """Run the LLM stages with the configured execution strategy"""
+        dhenu_answered = asyncio.Event()
+        chain = asyncio.create_task(self.run_dhenu_chain(user_message_en, context, original_language, deadline, dhenu_answered))
+        if self.strategy == "parallel":
+            # Gemini answers directly while Dhenu runs; Dhenu's grounded answer wins if it lands in time
+            direct = asyncio.create_task(self.run_gemini_direct(user_message_en, context, original_language, deadline))
+            result = await self.first_valid([chain, direct], preferred=chain, grace=CHAT_PARALLEL_GRACE)
+        elif self.strategy == "hedged":
+            # Only start the backup once the Dhenu call is slower than usual; if Dhenu answered
+            # in time, the chain finishes its reformatting without a competitor
+            delay = self.dhenu_latency.percentile(CHAT_HEDGE_PERCENTILE) or CHAT_HEDGE_DELAY
+            answered = asyncio.create_task(dhenu_answered.wait())
+            await asyncio.wait({chain, answered}, timeout=min(delay, deadline.remaining()), return_when=asyncio.FIRST_COMPLETED)
+            answered.cancel()
+            if chain.done() or dhenu_answered.is_set():
+                result = await chain
+                if not result["valid"] and deadline.remaining() > 0:
+                    result = await self.run_gemini_direct(user_message_en, context, original_language, deadline)
+            else:
+                direct = asyncio.create_task(self.run_gemini_direct(user_message_en, context, original_language, deadline))
+                result = await self.first_valid([chain, direct])
+        else:
+            result = await chain
+        
+        if result and result["valid"]:
+            return result
+        knowledge = context.get('knowledge') or []
+        if result and result.get("dhenu_advice") == self.DHENU_ERROR_MESSAGE:
+            description = self.DHENU_ERROR_MESSAGE
+        else:
+            description = knowledge[0]["content"] if knowledge else self.TIMEOUT_MESSAGE
+        return {
+            "advisory": {"description": description, "recommendations": []},
+            "dhenu_advice": result.get("dhenu_advice") if result else None,
+            "answered_by": "knowledge_base" if knowledge and description != self.DHENU_ERROR_MESSAGE else "none",
+        }
+
+    async def process_chat(self, request_data: Dict, user=None, include_audio: bool = True) -> Dict:
         """Process chat request through the pipeline with language handling"""
         try:
             # Extract user message and location
@@ -237,6 +440,18 @@ Return only valid JSON in this exact format and in the given language:
             if not user_message:
                 return {"error": "No message provided"}
             
+            deadline = Deadline()
+            requested_language = request_data.get('language')
+            preferred_language = user.language_preference if user else None
+            language_hint = normalize_language(requested_language) or normalize_language(preferred_language) or 'en'
+            
+            # Resolve the original language of the user's message while location/weather load
+            language_task = asyncio.create_task(deadline.run(
+                "language",
+                self.resolve_language(user_message, requested=requested_language, preferred=preferred_language),
+                fallback=(language_hint, "fallback")
+            ))
+            
             # Get location details
             location = request_data.get('location', {})
             lat = location.get('lat')
@@ -247,19 +462,20 @@ Return only valid JSON in this exact format and in the given language:
                 weather_data = {"error": "No coordinates provided"}
             else:
                 location_name, weather_data = await asyncio.gather(
-                    self.get_location_name(lat, lng),
-                    self.get_weather(lat, lng)
-                )       
+                    deadline.run("location", self.get_location_name(lat, lng), fallback="Unknown Location"),
+                    deadline.run("weather", self.get_weather(lat, lng), fallback=lambda: self.cached_weather(lat, lng))
+                )
+                if "error" in weather_data:
+                    weather_data = self.cached_weather(lat, lng)
             
-            # Detect the original language of the user's message
-            original_language = await self.detect_language(user_message)
+            original_language, language_source = await language_task
             
             # Translate user message to English for processing
             if original_language != 'en':
-                user_message_en = await self.translate_text(
-                    text=user_message,
-                    target_lang='en',
-                    source_lang=original_language
+                user_message_en = await deadline.run(
+                    "translate",
+                    self.translate_text(text=user_message, target_lang='en', source_lang=original_language),
+                    fallback=user_message
                 )
             else:
                 user_message_en = user_message
@@ -272,37 +488,41 @@ Return only valid JSON in this exact format and in the given language:
                 'messages': [{'role': 'user', 'content': user_message_en}]
             }
             
-            # Get response from Dhenu AI
-             # Run Dhenu & Gemini in parallel
-            dhenu_task = self.get_dhenu_response(user_message_en, context)
-            dhenu_response = await dhenu_task
+            # Ground the LLMs in the local knowledge base
+            knowledge = await knowledge_retriever.search(user_message_en, crop=request_data.get('crop_name'))
+            context['knowledge'] = knowledge
+            direct_answer = knowledge_retriever.direct_answer(knowledge, crop=request_data.get('crop_name'))
+            confidence = 1.0  # Can adjust if you have scoring
             
-        # Translate back
-            if original_language != 'en':
-                final_response_task = asyncio.create_task ( self.get_enhanced_response(user_message_en, dhenu_response, context, original_language))
-                dhenu_advice_translated_task = asyncio.create_task(self.translate_text(dhenu_response, original_language, 'en'))
-                final_response, dhenu_advice_translated = await asyncio.gather(final_response_task, dhenu_advice_translated_task)
+            if direct_answer:
+                # Knowledge base covers the question well enough; skip Dhenu and Gemini
+                answered_by = "knowledge_base"
+                confidence = direct_answer["confidence"]
+                dhenu_advice_translated = None
+                final_response_json = await deadline.run(
+                    "translate_back", self.translate_advisory(direct_answer, original_language), fallback=direct_answer
+                )
             else:
-                final_response = await self.get_enhanced_response(user_message_en, dhenu_response, context, original_language)
-
-                dhenu_advice_translated = dhenu_response
-            cleaned_response = re.sub(r"^```(?:json)?|```$", "", final_response.strip(), flags=re.MULTILINE).strip()
-
-            try:
-                final_response_json = json.loads(cleaned_response)
-            except json.JSONDecodeError as e:
-                logger.error(f"Gemini did not return valid JSON: {final_response}")
-                final_response_json = {
-                    "description": final_response or "No description provided",
-                    "recommendations": []
-                }
-        # Generate audio before sending response
-            audio_file = await self.text_to_speech(final_response_json.get ("description", "No description provided"), lang=original_language)
+                result = await self.generate_advisory(user_message_en, context, original_language, deadline)
+                final_response_json = result["advisory"]
+                dhenu_advice_translated = result.get("dhenu_advice")
+                answered_by = result["answered_by"]
+        # Generate audio before sending response (lean clients fetch it separately instead)
+            audio_file = None
+            if include_audio:
+                audio_file = await deadline.run(
+                    "tts",
+                    self.text_to_speech(final_response_json.get ("description", "No description provided"), lang=original_language),
+                    fallback=""
+                )
+            
+            if deadline.degraded:
+                logger.warning(f"Chat answered in degraded mode: {deadline.report()}")
 
             return {
             "query": user_message,  # Original user query
             "response": final_response_json.get("description", "No description provided"),  # Final answer in user's language
-            "confidence": 1.0,  # Can adjust if you have scoring
+            "confidence": confidence,
             "recommendations": final_response_json.get("recommendations", []),  # Example: split lines as recommendations
             "audio_response": audio_file,
             "weather_data": {
@@ -313,10 +533,19 @@ Return only valid JSON in this exact format and in the given language:
                 "wind_speed": weather_data.get("wind", {}).get("speed")
             },
             "market_data": None,
+            "degraded_stages": deadline.degraded,
             "sources": {
                 "original_language": original_language,
+                "language_source": language_source,
+                # English text the pipeline worked from, when the query was translated
+                "translated_query": user_message_en if user_message_en != user_message else None,
                 "dhenu_advice": dhenu_advice_translated,
-                "english_response": final_response_json
+                "english_response": final_response_json,
+                "knowledge": [hit["title"] for hit in knowledge],
+                "answered_from_knowledge_base": bool(direct_answer),
+                "answered_by": answered_by,
+                "strategy": self.strategy,
+                "pipeline": deadline.report()
             },
             
         }           
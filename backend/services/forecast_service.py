@@ -1,16 +1,112 @@
-import pandas as pd
-import numpy as np
-from datetime import datetime, timedelta
+from bisect import insort
+import asyncio
 import logging
+import os
+import threading
+import time
 from pathlib import Path
-from typing import Optional, List, Dict, Any
+from typing import TYPE_CHECKING, BinaryIO, Optional, List, Dict, Any, Tuple
+from dotenv import load_dotenv
+
+# pandas/numpy are imported where they are used: the dataset loads in the background at
+# startup, so importing this module must not pay for them
+if TYPE_CHECKING:
+    import pandas as pd
+    from services.price_store import PriceStore
+
+from services.series_stats import PRICE_TYPES, SeriesStats
+from utils.cache import shared_cache
+from utils.file_lock import file_lock
+
+load_dotenv()
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-dataset: Optional[pd.DataFrame] = None
+# Loaded once per process, or once in the gunicorn master and shared copy-on-write with the workers.
+# The DataFrame itself is dropped after loading: price_store, locations and series_stats hold what is served
+locations: Optional[Dict[str, Any]] = None
+# idle -> loading -> ready | failed
+status = "idle"
+load_error: Optional[str] = None
+# Guards loading, ingest and series rebuilds
+_load_lock = threading.RLock()
+# Price rows held in price_store, for the startup summary
+row_count = 0
+# The same rows as sorted per-series numpy arrays, for date-range queries without scanning the frame
+price_store: Optional["PriceStore"] = None
+# Running aggregates per series key (see series_stats); state-level "*" series are added on first use
+series_stats: Dict[str, SeriesStats] = {}
+# The state-level keys in series_stats, so ingest knows whether to update them without scanning every key
+_state_level_keys = set()
+# Series whose history changed in the middle (back-dated rows); rebuilt from the price store on next read
+_stale_stats = set()
+# Bytes of DATASET_APPEND_PATH reflected in memory. The append file is the ingest log shared by
+# every worker, so equal versions mean equal data, and cached forecasts are keyed by it
+data_version = 0
+
+# Rows ingested after the CSV snapshot (POST /forecast/ingest). Every worker appends to and replays
+# from this file, so all workers (and instances sharing the volume) converge on the same rows
+DATASET_APPEND_PATH = os.getenv("DATASET_APPEND_PATH", "dataset/appended_prices.csv")
+
+# Rolling-origin backtest settings; winners are cached per series for "auto" model selection
+BACKTEST_HORIZON = int(os.getenv("BACKTEST_HORIZON", "14"))
+BACKTEST_ORIGINS = int(os.getenv("BACKTEST_ORIGINS", "3"))
+BACKTEST_CACHE_TTL = int(os.getenv("BACKTEST_CACHE_TTL", "86400"))
+BACKTEST_WORKERS = int(os.getenv("BACKTEST_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# Low-cardinality text columns are stored as categoricals: integer codes instead of millions of
+# Python string objects, whose refcount updates would otherwise un-share forked pages
+CATEGORY_COLUMNS = ['STATE', 'District Name', 'Market Name', 'Commodity', 'Variety', 'Grade']
+DATASET_COLUMNS = CATEGORY_COLUMNS + ['Min_Price', 'Max_Price', 'Modal_Price', 'Price Date']
+SERIES_COLUMNS = ['STATE', 'District Name', 'Commodity']
+PRICE_COLUMNS = {'min_price': 'Min_Price', 'modal_price': 'Modal_Price', 'max_price': 'Max_Price'}
+# Ingest row fields -> dataset columns
+INGEST_COLUMNS = {
+    'state': 'STATE', 'district': 'District Name', 'market': 'Market Name', 'crop': 'Commodity',
+    'variety': 'Variety', 'grade': 'Grade', 'min_price': 'Min_Price', 'max_price': 'Max_Price',
+    'modal_price': 'Modal_Price', 'date': 'Price Date',
+}
+
+def clean_prices(df: "pd.DataFrame") -> "pd.DataFrame":
+    """Drop rows without a series or date, coerce prices to numbers and dates to datetimes"""
+    import pandas as pd
+    df = df.dropna(subset=['STATE', 'District Name', 'Commodity', 'Price Date'])
+    for col in PRICE_COLUMNS.values():
+        df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
+    df['Price Date'] = pd.to_datetime(df['Price Date'], errors='coerce')
+    return df.dropna(subset=['Price Date'])
+
+def categorize(df: "pd.DataFrame") -> "pd.DataFrame":
+    for col in CATEGORY_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+    return df
+
+def read_appended(f: BinaryIO, start: int) -> Tuple[Optional["pd.DataFrame"], int]:
+    """Complete rows of the append file from byte `start`, and the offset just past them"""
+    import io
+    import pandas as pd
+    f.seek(start)
+    chunk = f.read()
+    chunk = chunk[:chunk.rfind(b"\n") + 1]
+    if not chunk:
+        return None, start
+    if start == 0:
+        rows = pd.read_csv(io.BytesIO(chunk))
+    else:
+        rows = pd.read_csv(io.BytesIO(chunk), header=None, names=DATASET_COLUMNS)
+    return rows, start + len(chunk)
+
+def append_file_size() -> int:
+    try:
+        return os.stat(DATASET_APPEND_PATH).st_size
+    except OSError:
+        return 0
 
-def load_dataset() -> pd.DataFrame:
+def load_dataset() -> Tuple["pd.DataFrame", int]:
+    """The price CSV with ingested rows replayed on top, and how many bytes of the append file that covers"""
+    import pandas as pd
     possible_paths = [
         "dataset/Agriculture_price_dataset.csv",
     ]
@@ -24,19 +120,231 @@ def load_dataset() -> pd.DataFrame:
         raise FileNotFoundError("Agriculture_price_dataset.csv not found")
     logger.info(f"Loading dataset from: {dataset_path}")
     df = pd.read_csv(dataset_path)
-    df = df.dropna(subset=['STATE', 'District Name', 'Commodity', 'Price Date'])
-    price_columns = ['Min_Price', 'Modal_Price', 'Max_Price']
-    for col in price_columns:
-        df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
-    df['Price Date'] = pd.to_datetime(df['Price Date'], errors='coerce')
-    df = df.dropna(subset=['Price Date'])
-    df = df.sort_values('Price Date')
+    appended_bytes = 0
+    if Path(DATASET_APPEND_PATH).exists():
+        with open(DATASET_APPEND_PATH, "rb") as f, file_lock(f, exclusive=False):
+            appended, appended_bytes = read_appended(f, 0)
+        if appended is not None:
+            logger.info(f"Replaying {len(appended)} ingested rows from: {DATASET_APPEND_PATH}")
+            df = pd.concat([df, appended], ignore_index=True)
+    df = clean_prices(df)
+    df = categorize(df.sort_values('Price Date', kind='stable'))
     logger.info(f"Dataset loaded successfully: {len(df)} records")
     logger.info(f"Date range: {df['Price Date'].min()} to {df['Price Date'].max()}")
     logger.info(f"States: {df['STATE'].nunique()}")
     logger.info(f"Districts: {df['District Name'].nunique()}")
     logger.info(f"Crops: {df['Commodity'].nunique()}")
-    return df
+    return df, appended_bytes
+
+def build_locations(df: "pd.DataFrame") -> Dict[str, Any]:
+    """States, districts per state and crops per district, for the location pickers"""
+    states = sorted(df['STATE'].unique())
+    districts = {}
+    crops = {}
+    for state, state_df in df.groupby('STATE', observed=True):
+        districts[state] = sorted(state_df['District Name'].unique())
+        crops[state] = {
+            district: sorted(district_df['Commodity'].unique())
+            for district, district_df in state_df.groupby('District Name', observed=True)
+        }
+    return {"states": states, "districts": districts, "crops": crops}
+
+def add_locations(df: "pd.DataFrame"):
+    """Fold new (state, district, crop) combinations into `locations`, keeping the lists sorted"""
+    for state, district, crop in df[SERIES_COLUMNS].drop_duplicates().itertuples(index=False):
+        if state not in locations["districts"]:
+            insort(locations["states"], state)
+            locations["districts"][state] = []
+            locations["crops"][state] = {}
+        if district not in locations["crops"][state]:
+            insort(locations["districts"][state], district)
+            locations["crops"][state][district] = []
+        if crop not in locations["crops"][state][district]:
+            insort(locations["crops"][state][district], crop)
+
+def index_prices(store: "PriceStore", df: "pd.DataFrame") -> "PriceStore":
+    """Add df's rows to the per-series arrays of `store`"""
+    import numpy as np
+    days = df['Price Date'].values.astype('datetime64[D]').astype(np.int64)
+    prices = df[[PRICE_COLUMNS[price_type] for price_type in PRICE_TYPES]].to_numpy(dtype=np.float64)
+    for group_key, positions in df.groupby(SERIES_COLUMNS, observed=True, sort=False).indices.items():
+        store.append(tuple(group_key), days[positions], prices[positions])
+    return store
+
+def daily_totals(df: "pd.DataFrame", keys: List[str]) -> "pd.DataFrame":
+    """Per (keys..., day number): price sums in PRICE_TYPES order and the row count, sorted"""
+    import numpy as np
+    columns = [PRICE_COLUMNS[price_type] for price_type in PRICE_TYPES]
+    days = df['Price Date'].values.astype('datetime64[D]').astype(np.int64)
+    grouped = df[keys + columns].assign(day=days).groupby(keys + ['day'], observed=True, sort=True)
+    totals = grouped[columns].sum()
+    totals['count'] = grouped.size()
+    return totals
+
+def build_series_stats(df: "pd.DataFrame", keys: List[str] = SERIES_COLUMNS) -> Dict[str, SeriesStats]:
+    """Running aggregates for every series in df, from one groupby (district series, or state-level with keys STATE/Commodity)"""
+    totals = daily_totals(df, keys)
+    columns = [PRICE_COLUMNS[price_type] for price_type in PRICE_TYPES]
+    stats = {}
+    for group_key, group in totals.groupby(level=list(range(len(keys))), observed=True, sort=False):
+        state, district, crop = group_key if len(keys) == 3 else (group_key[0], None, group_key[1])
+        stats[series_key(state, district, crop)] = SeriesStats.from_daily(
+            group.index.get_level_values('day').to_numpy(), group[columns].to_numpy(), group['count'].to_numpy()
+        )
+    return stats
+
+def update_series_stats(new: "pd.DataFrame") -> Dict[str, int]:
+    """Fold ingested rows into the running aggregates: O(new rows) unless a series got back-dated rows"""
+    columns = [PRICE_COLUMNS[price_type] for price_type in PRICE_TYPES]
+    updated = set()
+    for keys in [SERIES_COLUMNS] + ([['STATE', 'Commodity']] if _state_level_keys else []):
+        totals = daily_totals(new, keys)
+        for group_key, row in zip(totals.index, totals[columns + ['count']].to_numpy()):
+            if len(keys) == 3:
+                key = series_key(*group_key[:3])
+            else:
+                key = series_key(group_key[0], None, group_key[1])
+                if key not in _state_level_keys:
+                    continue  # built from the merged dataset on first use
+            stats = series_stats.setdefault(key, SeriesStats())
+            if not stats.add_day_rows(int(group_key[-1]), row[:-1], int(row[-1])):
+                _stale_stats.add(key)
+            updated.add(key)
+    return {"series_updated": len(updated - _stale_stats), "series_stale": len(updated & _stale_stats)}
+
+def preload():
+    """Load the dataset into the price store, locations and series stats once; later calls (and other threads) reuse them"""
+    from services.price_store import PriceStore
+    global locations, price_store, row_count, data_version, status, load_error
+    with _load_lock:
+        if status == "ready":
+            return
+        status = "loading"
+        try:
+            df, data_version = load_dataset()
+            locations = build_locations(df)
+            price_store = index_prices(PriceStore(), df)
+            series_stats.clear()
+            series_stats.update(build_series_stats(df))
+            _state_level_keys.clear()
+            _stale_stats.clear()
+            row_count = len(df)
+            status, load_error = "ready", None
+        except Exception as e:
+            status, load_error = "failed", str(e)
+            raise
+
+def is_ready() -> bool:
+    return status == "ready"
+
+def get_locations() -> Optional[Dict[str, Any]]:
+    return locations
+
+def get_price_store() -> Optional["PriceStore"]:
+    """The per-series arrays, or None while the dataset is still loading"""
+    return price_store if status == "ready" else None
+
+def series_frame(state: str, district: Optional[str], crop: str) -> "pd.DataFrame":
+    """Rows of one series (every district of the state when district is None) as date + price columns, by date"""
+    import pandas as pd
+    days, prices = price_store.rows(state, district, crop)
+    frame = pd.DataFrame(prices, columns=list(PRICE_TYPES))
+    frame.insert(0, 'date', pd.to_datetime(days.astype('datetime64[D]')))
+    return frame
+
+def get_series_stats(key: str) -> Optional[SeriesStats]:
+    """
+    Running aggregates for a series key, or None if the series has no data.
+
+    State-level keys ("state|*|crop") are built on first use and then kept
+    current by ingest; series with back-dated rows are rebuilt here, from the
+    price store, so the cost is the series' size rather than the dataset's.
+    """
+    stats = series_stats.get(key)
+    if stats is not None and key not in _stale_stats:
+        return stats
+    with _load_lock:
+        if get_price_store() is None:
+            return None
+        state, district, crop = key.split("|")
+        days, sums, counts = price_store.daily_totals(state, None if district == "*" else district, crop)
+        if not len(days):
+            return None
+        stats = SeriesStats.from_daily(days, sums, counts)
+        series_stats[key] = stats
+        if district == "*":
+            _state_level_keys.add(key)
+        _stale_stats.discard(key)
+        return stats
+
+def _apply_rows(new: "pd.DataFrame") -> Dict[str, int]:
+    """Fold cleaned rows into the running aggregates, price store and locations"""
+    global row_count
+    result = update_series_stats(new)
+    index_prices(price_store, new)
+    add_locations(new)
+    row_count += len(new)
+    return result
+
+def _apply_appended(f: BinaryIO) -> int:
+    """Apply append-file rows past data_version (written by other workers); caller holds the locks"""
+    global data_version
+    rows, end = read_appended(f, data_version)
+    if rows is None:
+        return 0
+    rows = clean_prices(rows).sort_values('Price Date', kind='stable')
+    if not rows.empty:
+        _apply_rows(rows)
+    data_version = end
+    return len(rows)
+
+def sync_appended() -> int:
+    """Catch up with rows other workers ingested since this one last looked; returns rows applied"""
+    if not is_ready() or append_file_size() <= data_version:
+        return 0
+    with _load_lock, open(DATASET_APPEND_PATH, "rb") as f, file_lock(f, exclusive=False):
+        applied = _apply_appended(f)
+    if applied:
+        logger.info(f"Applied {applied} price rows ingested by other workers")
+    return applied
+
+async def refresh():
+    """For handlers: a stat() when nothing changed, a threaded catch-up when another worker ingested"""
+    if is_ready() and append_file_size() > data_version:
+        await asyncio.to_thread(sync_appended)
+
+def append_prices(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Ingest new price rows (e.g. the day's mandi arrivals) without reloading the dataset.
+
+    Rows go to the shared append file under an exclusive lock, after first
+    applying anything other workers wrote, so data_version (the file length)
+    identifies the same data in every worker; the others pick the rows up
+    through refresh() before serving price data. In memory, the running
+    aggregates, price store and locations update in O(new rows).
+    """
+    import pandas as pd
+    global data_version
+    if not is_ready():
+        raise RuntimeError("Price data not loaded yet")
+    new = pd.DataFrame(rows).rename(columns=INGEST_COLUMNS).reindex(columns=DATASET_COLUMNS)
+    new = clean_prices(new).sort_values('Price Date', kind='stable')
+    result = {"accepted": len(new), "rejected": len(rows) - len(new)}
+    if new.empty:
+        return {**result, "series_updated": 0, "series_stale": 0, "data_version": data_version}
+    path = Path(DATASET_APPEND_PATH)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with _load_lock, path.open("a+b") as f, file_lock(f, exclusive=True):
+        _apply_appended(f)
+        f.seek(0, os.SEEK_END)
+        payload = new.to_csv(index=False, header=f.tell() == 0, date_format='%Y-%m-%d').encode()
+        f.write(payload)
+        f.flush()
+        result.update(_apply_rows(new))
+        data_version = f.tell()
+        result["data_version"] = data_version
+    logger.info(f"Ingested {result['accepted']} price rows ({result['series_updated']} series updated)")
+    return result
 
 def calculate_linear_regression(x_values, y_values):
     n = len(x_values)
@@ -62,43 +370,157 @@ def calculate_mape(actual, predicted):
             errors.append(abs((a - p) / a))
     return (sum(errors) / len(errors)) * 100 if errors else 0
 
-def generate_forecast(data, price_type, forecast_days):
+def daily_prices(data: "pd.DataFrame", price_type: str):
+    """(dates, values) for one series: daily mean of `price_type` across markets, sorted by date"""
+    from services.forecasters import daily_series
+    return daily_series(data['date'].values, data[price_type].values)
+
+def series_key(state: str, district: Optional[str], crop: str) -> str:
+    return f"{state}|{district or '*'}|{crop}"
+
+def model_cache_key(key: str, price_type: str, last_date: str) -> str:
+    # Keyed by the last observed date, so new data gets a fresh backtest
+    return f"forecast-model:{key}:{price_type}:{last_date}"
+
+async def select_model(key: str, dates, values, price_type: str, requested: str = "auto"):
+    """
+    (model name, backtest result or None) for a series.
+
+    "auto" uses the cached backtest winner, backtesting this one series on a
+    miss; an explicit model is used as-is, with the cached backtest (if any)
+    supplying its out-of-sample MAPE.
+    """
+    from services.forecasters import DEFAULT_MODEL, backtest_series, create_forecaster
+    if requested != "auto":
+        create_forecaster(requested)  # validates the name
+    cache_key = model_cache_key(key, price_type, str(dates[-1]))
+    backtest = await shared_cache.get(cache_key)
+    if backtest is None and requested == "auto":
+        backtest = await asyncio.to_thread(backtest_series, dates, values, None, BACKTEST_HORIZON, BACKTEST_ORIGINS)
+        await shared_cache.set(cache_key, backtest, BACKTEST_CACHE_TTL)
+    if requested != "auto":
+        return requested, backtest
+    return (backtest or {}).get("winner") or DEFAULT_MODEL, backtest
+
+def generate_forecast(data, price_type, forecast_days, model: Optional[str] = None, backtest: Optional[Dict] = None,
+                      stats: Optional[SeriesStats] = None):
+    import numpy as np
+    from services.forecasters import DEFAULT_MODEL, create_forecaster, ols_slope
     if len(data) < 10:
         raise ValueError("Need at least 10 data points for forecasting")
-    prices = data[price_type].values
-    dates = data['date'].values
-    x_values = list(range(len(prices)))
-    slope, intercept = calculate_linear_regression(x_values, prices)
+    dates, prices = daily_prices(data, price_type)
+    forecaster = create_forecaster(model or DEFAULT_MODEL)
+    if len(prices) < forecaster.min_points:
+        raise ValueError(f"Model '{forecaster.name}' needs at least {forecaster.min_points} days of prices")
+    forecaster.fit(dates, prices)
+
+    # One row per calendar day after the last observation
+    horizon = np.arange(1, forecast_days + 1)
+    future_dates = dates[-1] + horizon.astype('timedelta64[D]')
+    predicted = np.maximum(0, forecaster.predict(future_dates))
+    spread = 1.96 * forecaster.interval_std(horizon)
+    forecast_data = [
+        {
+            'date': str(date),
+            'min_price': float(price) * 0.95,
+            'modal_price': float(price),
+            'max_price': float(price) * 1.05,
+            'is_forecast': True,
+            'confidence_upper': float(price + width),
+            'confidence_lower': float(max(0, price - width))
+        }
+        for date, price, width in zip(future_dates, predicted, spread)
+    ]
+
     window_size = min(30, len(prices))
     recent_prices = prices[-window_size:]
-    moving_avg = np.mean(recent_prices)
-    volatility = np.std(recent_prices)
-    last_date = pd.to_datetime(dates[-1])
-    forecast_data = []
-    for i in range(1, forecast_days + 1):
-        forecast_date = last_date + timedelta(days=i)
-        trend_value = slope * (len(prices) + i) + intercept
-        forecast_price = (moving_avg * 0.7) + (trend_value * 0.3)
-        seasonal_factor = 1 + 0.1 * np.sin(2 * np.pi * i / 365)
-        adjusted_price = max(0, forecast_price * seasonal_factor)
-        forecast_data.append({
-            'date': forecast_date.strftime('%Y-%m-%d'),
-            'min_price': adjusted_price * 0.95,
-            'modal_price': adjusted_price,
-            'max_price': adjusted_price * 1.05,
-            'is_forecast': True,
-            'confidence_upper': adjusted_price + 1.96 * volatility,
-            'confidence_lower': max(0, adjusted_price - 1.96 * volatility)
-        })
-    test_predictions = [slope * i + intercept for i in range(max(0, len(prices) - 30), len(prices))]
-    test_actual = prices[-len(test_predictions):] if len(test_predictions) <= len(prices) else prices
-    mape = calculate_mape(test_actual, test_predictions[:len(test_actual)])
+    if stats is not None:
+        # O(1) reads from the running aggregates
+        stream = stats.streams[price_type]
+        slope, avg_price, volatility = stream.slope(), stream.mean(), stream.volatility()
+    else:
+        slope = ols_slope(dates, prices)
+        avg_price, volatility = float(np.mean(recent_prices)), float(np.std(recent_prices))
+    score = ((backtest or {}).get("scores") or {}).get(forecaster.name)
+    if score is not None:
+        mape, mape_source = score["mape"], "backtest"
+    else:
+        # Too little history to hold data out: in-sample fit of the linear trend over the last 30 points
+        x_values = list(range(len(prices)))
+        reg_slope, intercept = calculate_linear_regression(x_values, list(prices))
+        mape = calculate_mape(recent_prices, [reg_slope * i + intercept for i in x_values[-window_size:]])
+        mape_source = "in_sample"
     metrics = {
         'trend': 'Increasing' if slope > 0 else 'Decreasing',
-        'avg_price': float(moving_avg),
+        'avg_price': float(avg_price),
         'volatility': float(volatility),
         'mape': float(mape),
+        'mape_source': mape_source,
+        'model': forecaster.name,
+        'model_scores': {name: result["mape"] for name, result in ((backtest or {}).get("scores") or {}).items()},
         'data_points': len(data),
         'date_range': f"{dates[0]} to {dates[-1]}"
     }
     return forecast_data, metrics
+
+async def forecast(data, price_type: str, forecast_days: int, key: str, model: str = "auto"):
+    """
+    Pick the model for this series (see select_model) and forecast with it.
+    Backtests, model fits and stat rebuilds are CPU-bound, so they run in threads.
+    """
+    dates, values = await asyncio.to_thread(daily_prices, data, price_type)
+    name, backtest = await select_model(key, dates, values, price_type, model)
+    stats = await asyncio.to_thread(get_series_stats, key) if price_type in PRICE_COLUMNS else None
+    return await asyncio.to_thread(
+        generate_forecast, data, price_type, forecast_days, model=name, backtest=backtest, stats=stats
+    )
+
+def backtest_all(price_type: str = "modal_price", models: Optional[List[str]] = None, horizon: int = None,
+                 origins: int = None, workers: int = None, state: Optional[str] = None, crop: Optional[str] = None) -> Dict[str, Dict]:
+    """
+    Rolling-origin backtest of every district series (optionally one state/crop) in a process pool.
+
+    Returns {series key: backtest result}. CPU-bound and blocking: run it in a thread.
+    """
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    from services.forecasters import backtest_task, create_forecaster
+    store = get_price_store()
+    if store is None:
+        raise RuntimeError("Price data not loaded yet")
+    for name in models or []:
+        create_forecaster(name)
+    column = PRICE_TYPES.index(price_type)
+    horizon = horizon or BACKTEST_HORIZON
+    origins = origins or BACKTEST_ORIGINS
+    workers = workers or BACKTEST_WORKERS
+    items = []
+    for series in store.match(state=state, crop=crop):
+        days, prices = store.series[series].snapshot()
+        items.append((series_key(*series), days.astype('datetime64[D]'), prices[:, column], models, horizon, origins))
+    if workers <= 1 or len(items) < 2:
+        return dict(map(backtest_task, items))
+    # spawn: forking a process that runs an event loop and thread pools is not safe
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return dict(pool.map(backtest_task, items, chunksize=max(1, len(items) // (workers * 4))))
+
+async def run_backtest(price_type: str = "modal_price", **options) -> Dict[str, Any]:
+    """Backtest all series, cache each winner for "auto" forecasts and summarise per model"""
+    started = time.perf_counter()
+    results = await asyncio.to_thread(backtest_all, price_type, **options)
+    wins: Dict[str, int] = {}
+    mapes: Dict[str, List[float]] = {}
+    for key, result in results.items():
+        await shared_cache.set(model_cache_key(key, price_type, result["last_date"]), result, BACKTEST_CACHE_TTL)
+        if result["winner"]:
+            wins[result["winner"]] = wins.get(result["winner"], 0) + 1
+        for name, score in result["scores"].items():
+            mapes.setdefault(name, []).append(score["mape"])
+    return {
+        "price_type": price_type,
+        "series": len(results),
+        "evaluated": sum(1 for result in results.values() if result["winner"]),
+        "wins": wins,
+        "mean_mape": {name: round(sum(values) / len(values), 3) for name, values in mapes.items()},
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
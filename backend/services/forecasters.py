@@ -0,0 +1,292 @@
+"""
+Price forecasters behind a common interface, plus rolling-origin backtesting.
+
+Every model works on a daily series: `dates` (datetime64[D], ascending,
+unique) and `values`. Dates may be irregular; models that need a regular
+grid interpolate over the gaps, the regression works on real day offsets.
+This module only depends on numpy so it can run in backtest worker
+processes without pulling in pandas.
+"""
+import math
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+SEASON_LENGTH = 7  # mandi prices have a weekly rhythm (market days)
+
+
+def day_numbers(dates: np.ndarray) -> np.ndarray:
+    return dates.astype("datetime64[D]").astype(np.int64)
+
+
+def weekdays(dates: np.ndarray) -> np.ndarray:
+    """Monday=0 ... Sunday=6 (1970-01-01 was a Thursday)"""
+    return (day_numbers(dates) + 3) % 7
+
+
+def daily_series(dates: np.ndarray, values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Collapse several rows per day (markets, duplicates) into the daily mean, sorted by date"""
+    dates = dates.astype("datetime64[D]")
+    values = np.asarray(values, dtype=np.float64)
+    unique, inverse = np.unique(dates, return_inverse=True)
+    sums = np.bincount(inverse, weights=values, minlength=len(unique))
+    counts = np.bincount(inverse, minlength=len(unique))
+    return unique, sums / counts
+
+
+def regular_grid(dates: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """Values on every calendar day from first to last date, linearly interpolated over gaps"""
+    days = day_numbers(dates)
+    grid = np.arange(days[0], days[-1] + 1)
+    return np.interp(grid, days, values)
+
+
+class Forecaster:
+    """fit() on a daily series, then predict() any future dates; residual_std sizes the intervals."""
+
+    name = "base"
+    min_points = 2
+
+    def __init__(self):
+        self.residual_std = 0.0
+        self.last_date: Optional[np.datetime64] = None
+
+    def fit(self, dates: np.ndarray, values: np.ndarray) -> "Forecaster":
+        raise NotImplementedError
+
+    def predict(self, dates: np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+
+    def horizon(self, dates: np.ndarray) -> np.ndarray:
+        """Days ahead of the last fitted date (1 = the next day)"""
+        return day_numbers(dates) - day_numbers(np.array([self.last_date]))[0]
+
+    def interval_std(self, h: np.ndarray) -> np.ndarray:
+        """Forecast error std at each horizon; flat unless the model's errors compound"""
+        return np.full(len(h), self.residual_std)
+
+
+class SeasonalNaive(Forecaster):
+    """Repeat the last full week: tomorrow looks like the same weekday last week."""
+
+    name = "seasonal_naive"
+    min_points = SEASON_LENGTH
+
+    def fit(self, dates, values):
+        grid = regular_grid(dates, values)
+        self.last_date = dates[-1]
+        self.season = grid[-SEASON_LENGTH:] if len(grid) >= SEASON_LENGTH else grid[-1:]
+        if len(grid) > SEASON_LENGTH:
+            self.residual_std = float(np.std(grid[SEASON_LENGTH:] - grid[:-SEASON_LENGTH]))
+        return self
+
+    def predict(self, dates):
+        h = self.horizon(dates)
+        return self.season[(h - 1) % len(self.season)]
+
+    def interval_std(self, h):
+        # Each further week repeats the same values, so errors add up per completed season
+        return self.residual_std * np.sqrt((h - 1) // len(self.season) + 1)
+
+
+class DateRegression(Forecaster):
+    """
+    Least-squares trend on real day offsets with day-of-week effects.
+
+    Observations are weighted by recency (HALF_LIFE_DAYS) so the trend follows
+    the current regime rather than the whole multi-year history.
+    """
+
+    name = "regression"
+    min_points = 10
+    HALF_LIFE_DAYS = 60.0
+
+    def _design(self, days: np.ndarray, dows: np.ndarray) -> np.ndarray:
+        columns = [np.ones(len(days)), (days - self.origin) / 30.0]
+        if self.use_weekdays:
+            columns += [(dows == d).astype(np.float64) for d in range(1, 7)]
+        return np.column_stack(columns)
+
+    def fit(self, dates, values):
+        days = day_numbers(dates)
+        dows = weekdays(dates)
+        self.origin = days[-1]
+        self.last_date = dates[-1]
+        # Weekday dummies only when every weekday shows up often enough to estimate
+        self.use_weekdays = len(values) >= 28 and np.bincount(dows, minlength=7).min() >= 3
+        X = self._design(days, dows)
+        weights = np.sqrt(0.5 ** ((self.origin - days) / self.HALF_LIFE_DAYS))
+        self.coef, *_ = np.linalg.lstsq(X * weights[:, None], values * weights, rcond=None)
+        residuals = values - X @ self.coef
+        self.residual_std = float(np.sqrt(np.average(residuals ** 2, weights=weights ** 2)))
+        return self
+
+    def predict(self, dates):
+        return self._design(day_numbers(dates), weekdays(dates)) @ self.coef
+
+
+class HoltWinters(Forecaster):
+    """
+    Additive Holt-Winters (damped trend, weekly season) on the daily grid.
+
+    Smoothing parameters are chosen by one-step-ahead SSE over a small grid;
+    all candidates are run together as numpy vectors, so the grid search
+    costs one pass over the series.
+    """
+
+    name = "holt_winters"
+    min_points = 2 * SEASON_LENGTH
+    ALPHAS = (0.1, 0.3, 0.5, 0.8)
+    BETAS = (0.01, 0.05, 0.2)
+    GAMMAS = (0.05, 0.2, 0.4)
+    PHI = 0.98
+    MAX_HISTORY_DAYS = 730
+
+    def fit(self, dates, values):
+        y = regular_grid(dates, values)[-self.MAX_HISTORY_DAYS:]
+        self.last_date = dates[-1]
+        m = SEASON_LENGTH
+        if len(y) < 2 * m:
+            raise ValueError(f"Holt-Winters needs at least {2 * m} days of history")
+        alpha, beta, gamma = (np.array(p, dtype=np.float64) for p in zip(*[
+            (a, b, g) for a in self.ALPHAS for b in self.BETAS for g in self.GAMMAS
+        ]))
+        k = len(alpha)
+        level = np.full(k, y[:m].mean())
+        trend = np.full(k, (y[m:2 * m].mean() - y[:m].mean()) / m)
+        seasonal = np.tile(y[:m] - y[:m].mean(), (k, 1))
+        sse = np.zeros(k)
+        errors = np.empty((len(y) - m, k))
+        for t in range(m, len(y)):
+            s = seasonal[:, t % m]
+            forecast = level + self.PHI * trend + s
+            error = y[t] - forecast
+            errors[t - m] = error
+            sse += error * error
+            new_level = alpha * (y[t] - s) + (1 - alpha) * (level + self.PHI * trend)
+            trend = beta * (new_level - level) + (1 - beta) * self.PHI * trend
+            seasonal[:, t % m] = gamma * (y[t] - new_level) + (1 - gamma) * s
+            level = new_level
+        best = int(np.argmin(sse))
+        self.params = {"alpha": float(alpha[best]), "beta": float(beta[best]), "gamma": float(gamma[best])}
+        self.level, self.trend = float(level[best]), float(trend[best])
+        self.seasonal = seasonal[best].copy()
+        self.n = len(y)
+        self.residual_std = float(np.std(errors[:, best]))
+        return self
+
+    def predict(self, dates):
+        h = self.horizon(dates)
+        # Damped trend contribution: trend * (phi + phi^2 + ... + phi^h)
+        damped = self.PHI * (1 - self.PHI ** h) / (1 - self.PHI)
+        return self.level + damped * self.trend + self.seasonal[(self.n + h - 1) % SEASON_LENGTH]
+
+    def interval_std(self, h):
+        # Additive Holt-Winters approximation: var_h = s^2 * (1 + sum_{j<h} (alpha * (1 + j * beta))^2)
+        alpha, beta = self.params["alpha"], self.params["beta"]
+        j = np.arange(1, int(h.max()))
+        cumulative = np.concatenate([[0.0], np.cumsum((alpha * (1 + j * beta)) ** 2)])
+        return self.residual_std * np.sqrt(1 + cumulative[h - 1])
+
+
+class MovingAverageBlend(Forecaster):
+    """The original model: 70% recent moving average, 30% linear trend (now on real dates)."""
+
+    name = "blend"
+    min_points = 10
+    WINDOW = 30
+
+    def fit(self, dates, values):
+        recent = values[-self.WINDOW:]
+        self.moving_avg = float(np.mean(recent))
+        self.residual_std = float(np.std(recent))
+        self.trend = DateRegression()
+        self.trend.use_weekdays = False
+        days = day_numbers(dates)
+        self.trend.origin = days[-1]
+        X = self.trend._design(days, weekdays(dates))
+        self.trend.coef, *_ = np.linalg.lstsq(X, values, rcond=None)
+        self.last_date = dates[-1]
+        return self
+
+    def predict(self, dates):
+        return 0.7 * self.moving_avg + 0.3 * self.trend.predict(dates)
+
+
+FORECASTERS = {cls.name: cls for cls in (HoltWinters, DateRegression, SeasonalNaive, MovingAverageBlend)}
+# Used when a series is too short to backtest
+DEFAULT_MODEL = MovingAverageBlend.name
+
+
+def create_forecaster(name: str) -> Forecaster:
+    try:
+        return FORECASTERS[name]()
+    except KeyError:
+        raise ValueError(f"Unknown forecast model '{name}'. Available: auto, {', '.join(FORECASTERS)}")
+
+
+def ols_slope(dates: np.ndarray, values: np.ndarray) -> float:
+    """Least-squares price change per day over the whole series"""
+    days = day_numbers(dates).astype(np.float64)
+    if len(days) < 2 or np.ptp(days) == 0:
+        return 0.0
+    return float(np.polyfit(days - days[-1], values, 1)[0])
+
+
+def mape(actual: np.ndarray, predicted: np.ndarray) -> Optional[float]:
+    mask = actual != 0
+    if not mask.any():
+        return None
+    return float(np.mean(np.abs((actual[mask] - predicted[mask]) / actual[mask])) * 100)
+
+
+def backtest_series(dates: np.ndarray, values: np.ndarray, models: Optional[List[str]] = None,
+                    horizon: int = 14, origins: int = 3) -> Dict:
+    """
+    Rolling-origin evaluation: for each of the last `origins` cut-offs (spaced
+    `horizon` days apart), fit on everything up to the cut-off and score the
+    next `horizon` days of real observations.
+
+    Returns per-model MAPE/MAE over all held-out points and the winner (lowest
+    MAPE), or winner None when the series is too short to hold anything out.
+    """
+    dates, values = daily_series(dates, values)
+    models = models or list(FORECASTERS)
+    last = dates[-1]
+    errors: Dict[str, List[np.ndarray]] = {name: [] for name in models}
+    actuals: Dict[str, List[np.ndarray]] = {name: [] for name in models}
+    origins_used = 0
+    for k in range(origins, 0, -1):
+        cutoff = last - np.timedelta64(k * horizon, "D")
+        train = dates <= cutoff
+        test = (dates > cutoff) & (dates <= cutoff + np.timedelta64(horizon, "D"))
+        if not test.any():
+            continue
+        origins_used += 1
+        for name in models:
+            model = FORECASTERS[name]()
+            if train.sum() < model.min_points:
+                continue
+            try:
+                predicted = model.fit(dates[train], values[train]).predict(dates[test])
+            except (ValueError, np.linalg.LinAlgError):
+                continue
+            errors[name].append(values[test] - predicted)
+            actuals[name].append(values[test])
+
+    scores = {}
+    for name in models:
+        if not errors[name]:
+            continue
+        err, act = np.concatenate(errors[name]), np.concatenate(actuals[name])
+        score = mape(act, act - err)
+        if score is None or not math.isfinite(score):
+            continue
+        scores[name] = {"mape": round(score, 3), "mae": round(float(np.mean(np.abs(err))), 3), "points": int(len(err))}
+    winner = min(scores, key=lambda name: scores[name]["mape"]) if scores else None
+    return {"winner": winner, "scores": scores, "origins": origins_used, "horizon": horizon, "last_date": str(last)}
+
+
+def backtest_task(item: Tuple[str, np.ndarray, np.ndarray, Optional[List[str]], int, int]) -> Tuple[str, Dict]:
+    """Process-pool entry point: (series key, dates, values, models, horizon, origins)"""
+    key, dates, values, models, horizon, origins = item
+    return key, backtest_series(dates, values, models, horizon, origins)
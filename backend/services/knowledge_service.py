@@ -0,0 +1,277 @@
+import asyncio
+import logging
+import math
+import os
+import re
+import time
+import zlib
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Set
+from sqlalchemy import event, func
+from sqlalchemy.future import select
+from database import AsyncSessionLocal
+from models.knowledge import KnowledgeEntry
+
+logger = logging.getLogger(__name__)
+
+KB_TOP_K = int(os.getenv("KB_TOP_K", "3"))
+# Hits below this BM25 score are not worth putting in a prompt
+KB_MIN_SCORE = float(os.getenv("KB_MIN_SCORE", "1.0"))
+# Answer straight from the knowledge base (no LLM call) when enabled and the top hit reaches this
+# confidence; seed entries are short notes, so by default every answer goes through the LLMs
+KB_DIRECT_ANSWER = os.getenv("KB_DIRECT_ANSWER", "0").lower() in ("1", "true", "yes")
+KB_DIRECT_ANSWER_CONFIDENCE = float(os.getenv("KB_DIRECT_ANSWER_CONFIDENCE", "0.9"))
+# ...and only when at least this many query terms matched (one-word queries are too vague)
+KB_DIRECT_ANSWER_MIN_TERMS = int(os.getenv("KB_DIRECT_ANSWER_MIN_TERMS", "2"))
+# Optional hashed bag-of-words embeddings blended into the lexical score
+KB_EMBEDDINGS = os.getenv("KB_EMBEDDINGS", "0").lower() in ("1", "true", "yes")
+KB_EMBEDDING_DIM = int(os.getenv("KB_EMBEDDING_DIM", "512"))
+KB_EMBEDDING_WEIGHT = float(os.getenv("KB_EMBEDDING_WEIGHT", "0.3"))
+# How often to compare the table's row count and last update with the index, so edits made
+# through another worker (whose mapper events do not fire here) are picked up
+KB_VERSION_CHECK_SECONDS = float(os.getenv("KB_VERSION_CHECK_SECONDS", "30"))
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+# Term repetition used to weight fields in the indexed document
+TITLE_WEIGHT = 2
+KEYWORD_WEIGHT = 3
+
+STOPWORDS = {
+    "a", "an", "the", "and", "or", "of", "to", "in", "on", "for", "with", "is", "are", "was", "be",
+    "how", "what", "when", "why", "which", "do", "does", "i", "my", "me", "we", "our", "can", "should",
+    "it", "its", "this", "that", "there", "from", "at", "by", "as", "about", "please", "tell",
+}
+
+# Crop names looked for in entry titles/keywords and in the request's crop; an entry about one
+# crop is only given as a direct answer for that crop
+CROP_TERMS = {
+    "potato", "tomato", "wheat", "rice", "paddy", "maize", "onion", "cotton", "sugarcane", "soybean",
+    "groundnut", "mustard", "chickpea", "gram", "millet", "sorghum", "barley", "chilli", "brinjal",
+    "cabbage", "cauliflower", "banana", "mango", "grape", "apple", "tea", "coffee", "jute",
+}
+
+# Same rows schema.sql inserts, so SQLite deployments start with a usable index
+SEED_ENTRIES = [
+    {"category": "pest", "title": "Aphid Management", "content": "Aphids are small sap-sucking insects that can cause significant damage to crops. Early detection and integrated pest management approaches are recommended.", "keywords": ["aphid", "pest", "insect", "sap", "management"], "language": "en", "source": "Agricultural Extension Manual"},
+    {"category": "disease", "title": "Late Blight in Potatoes", "content": "Late blight is a devastating disease affecting potato crops. Symptoms include brown spots on leaves and stems. Preventive fungicide application is crucial.", "keywords": ["late blight", "potato", "fungus", "disease", "prevention"], "language": "en", "source": "Plant Pathology Guide"},
+    {"category": "crop", "title": "Wheat Variety Selection", "content": "Choose wheat varieties based on local climate conditions, soil type, and market demand. High-yielding varieties with disease resistance are preferred.", "keywords": ["wheat", "variety", "selection", "climate", "yield"], "language": "en", "source": "Crop Production Manual"},
+    {"category": "weather", "title": "Irrigation Scheduling", "content": "Proper irrigation scheduling based on weather forecasts can save water and improve crop yields. Monitor soil moisture and weather patterns.", "keywords": ["irrigation", "weather", "water", "scheduling", "moisture"], "language": "en", "source": "Water Management Guide"},
+    {"category": "soil", "title": "Soil pH Management", "content": "Most crops prefer slightly acidic to neutral soil pH (6.0-7.0). Regular soil testing and appropriate amendments are necessary for optimal growth.", "keywords": ["soil", "pH", "acid", "neutral", "testing"], "language": "en", "source": "Soil Science Manual"},
+]
+
+
+def _stem(token: str) -> str:
+    """Crude plural folding: 'aphids' -> 'aphid', 'potatoes' -> 'potato', 'varieties' -> 'variety'"""
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 4 and token.endswith("oes"):
+        return token[:-2]
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    return [_stem(t) for t in re.findall(r"\w+", (text or "").lower()) if t not in STOPWORDS]
+
+
+def crop_terms(text: Optional[str]) -> Set[str]:
+    return set(tokenize(text)) & CROP_TERMS
+
+
+class KnowledgeIndex:
+    """Inverted index with BM25 scoring over knowledge base entries, plus optional hashed embeddings."""
+
+    def __init__(self, entries: List[Dict], embeddings: bool = KB_EMBEDDINGS):
+        self.entries = entries
+        self.postings: Dict[str, List[tuple]] = defaultdict(list)
+        self.doc_lengths: List[int] = []
+        # Crops each entry is about, from its title and keywords
+        self.crops: List[List[str]] = []
+        for doc_id, entry in enumerate(entries):
+            self.crops.append(sorted(crop_terms(f"{entry.get('title')} {' '.join(entry.get('keywords') or [])}")))
+            terms = (
+                tokenize(entry.get("title")) * TITLE_WEIGHT
+                + tokenize(entry.get("content"))
+                + tokenize(" ".join(entry.get("keywords") or [])) * KEYWORD_WEIGHT
+            )
+            self.doc_lengths.append(len(terms))
+            for term, tf in Counter(terms).items():
+                self.postings[term].append((doc_id, tf))
+        n = len(entries)
+        self.avg_doc_length = (sum(self.doc_lengths) / n) if n else 0.0
+        self.idf = {term: math.log(1 + (n - len(p) + 0.5) / (len(p) + 0.5)) for term, p in self.postings.items()}
+        # An unseen query term is as informative as the rarest indexed term
+        self.max_idf = math.log(1 + (n + 0.5) / 0.5) if n else 0.0
+        self.matrix = self._embed_all() if embeddings and n else None
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _embed(self, terms: List[str]):
+        import numpy as np
+        vec = np.zeros(KB_EMBEDDING_DIM, dtype=np.float32)
+        for term in terms:
+            # Character trigrams let morphological variants ("irrigate"/"irrigation") overlap
+            padded = f"#{term}#"
+            for gram in [term] + [padded[i:i + 3] for i in range(len(padded) - 2)]:
+                vec[zlib.crc32(gram.encode()) % KB_EMBEDDING_DIM] += 1.0
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    def _embed_all(self):
+        import numpy as np
+        return np.vstack([
+            self._embed(tokenize(f"{e.get('title')} {e.get('content')} {' '.join(e.get('keywords') or [])}"))
+            for e in self.entries
+        ])
+
+    def search(self, query: str, k: int = KB_TOP_K) -> List[Dict]:
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or not self.entries:
+            return []
+        scores: Dict[int, float] = defaultdict(float)
+        matched: Dict[int, set] = defaultdict(set)
+        for term in terms:
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for doc_id, tf in self.postings[term]:
+                length_norm = 1 - BM25_B + BM25_B * self.doc_lengths[doc_id] / self.avg_doc_length
+                scores[doc_id] += idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * length_norm)
+                matched[doc_id].add(term)
+
+        if self.matrix is not None:
+            similarities = self.matrix @ self._embed(terms)
+            top_lexical = max(scores.values(), default=0.0) or 1.0
+            blended = {}
+            for doc_id, similarity in enumerate(similarities):
+                lexical = scores.get(doc_id, 0.0) / top_lexical
+                blended[doc_id] = ((1 - KB_EMBEDDING_WEIGHT) * lexical + KB_EMBEDDING_WEIGHT * float(similarity)) * top_lexical
+            scores = blended
+
+        query_weight = sum(self.idf.get(term, self.max_idf) for term in terms)
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [
+            dict(
+                self.entries[doc_id],
+                score=round(score, 4),
+                # Share of the query's information content this entry covers
+                confidence=round(sum(self.idf[t] for t in matched[doc_id]) / query_weight, 4) if query_weight else 0.0,
+                matched_terms=len(matched[doc_id]),
+                crops=self.crops[doc_id],
+            )
+            for doc_id, score in ranked
+            if score > 0
+        ]
+
+
+class KnowledgeRetriever:
+    """Holds the current KnowledgeIndex and rebuilds it after the table changes."""
+
+    def __init__(self):
+        self.index = KnowledgeIndex([])
+        self._dirty = True
+        self._lock = asyncio.Lock()
+        # (row count, highest id, latest updated_at) of the table the index was built from
+        self.version: Optional[tuple] = None
+        self._checked_at = 0.0
+
+    def mark_dirty(self):
+        self._dirty = True
+
+    async def seed_if_empty(self):
+        async with AsyncSessionLocal() as db:
+            count = (await db.execute(select(func.count()).select_from(KnowledgeEntry))).scalar()
+            if count:
+                return
+            db.add_all([KnowledgeEntry(**entry) for entry in SEED_ENTRIES])
+            await db.commit()
+            logger.info(f"Seeded knowledge base with {len(SEED_ENTRIES)} entries")
+
+    @staticmethod
+    async def table_version(db) -> tuple:
+        query = select(func.count(), func.max(KnowledgeEntry.id), func.max(KnowledgeEntry.updated_at))
+        return tuple((await db.execute(query)).one())
+
+    async def check_version(self):
+        """Mark the index dirty if the table changed in another process; at most every KB_VERSION_CHECK_SECONDS"""
+        now = time.monotonic()
+        if self._dirty or now - self._checked_at < KB_VERSION_CHECK_SECONDS:
+            return
+        self._checked_at = now
+        async with AsyncSessionLocal() as db:
+            if await self.table_version(db) != self.version:
+                self._dirty = True
+
+    async def refresh(self):
+        async with self._lock:
+            if not self._dirty:
+                return
+            # Clear first so edits made while we read trigger another rebuild
+            self._dirty = False
+            async with AsyncSessionLocal() as db:
+                version = await self.table_version(db)
+                rows = (await db.execute(select(KnowledgeEntry))).scalars().all()
+            entries = [
+                {
+                    "id": row.id,
+                    "category": row.category,
+                    "title": row.title,
+                    "content": row.content,
+                    "keywords": list(row.keywords or []),
+                    "language": row.language,
+                    "source": row.source,
+                }
+                for row in rows
+            ]
+            self.index = await asyncio.to_thread(KnowledgeIndex, entries)
+            self.version, self._checked_at = version, time.monotonic()
+            logger.info(f"Knowledge index built: {len(entries)} entries, {len(self.index.postings)} terms")
+
+    async def search(self, query: str, k: int = KB_TOP_K, crop: Optional[str] = None) -> List[Dict]:
+        """Entries for the query, with the request's crop (if any) added to it"""
+        try:
+            await self.check_version()
+            if self._dirty:
+                await self.refresh()
+        except Exception as e:
+            logger.error(f"Knowledge index refresh failed: {str(e)}")
+        if crop_terms(crop):
+            query = f"{query} {crop}"
+        return [hit for hit in self.index.search(query, k) if hit["score"] >= KB_MIN_SCORE]
+
+    def direct_answer(self, hits: List[Dict], crop: Optional[str] = None) -> Optional[Dict]:
+        """
+        Advisory built from the top hit when direct answers are enabled and it is confident
+        enough to skip the LLMs. An entry about specific crops only answers for one of them.
+        """
+        if not KB_DIRECT_ANSWER or not hits:
+            return None
+        top = hits[0]
+        if top["confidence"] < KB_DIRECT_ANSWER_CONFIDENCE or top["matched_terms"] < KB_DIRECT_ANSWER_MIN_TERMS:
+            return None
+        if top.get("crops") and not crop_terms(crop) & set(top["crops"]):
+            return None
+        sentences = [s.strip() for s in re.split(r"(?<=[.!?])\s+", top["content"] or "") if s.strip()]
+        return {
+            "description": sentences[0] if sentences else top["title"],
+            "recommendations": sentences[1:],
+            "confidence": top["confidence"],
+            "source": top.get("source"),
+        }
+
+
+knowledge_retriever = KnowledgeRetriever()
+
+@event.listens_for(KnowledgeEntry, "after_insert")
+@event.listens_for(KnowledgeEntry, "after_update")
+@event.listens_for(KnowledgeEntry, "after_delete")
+def _knowledge_changed(mapper, connection, target):
+    knowledge_retriever.mark_dirty()
+
+
+def format_knowledge(hits: List[Dict]) -> str:
+    """Reference notes for LLM prompts"""
+    return "\n".join(f"- {hit['title']}: {hit['content']} (Source: {hit.get('source') or 'Knowledge base'})" for hit in hits)
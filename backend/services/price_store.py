@@ -0,0 +1,248 @@
+"""
+Price rows indexed per series as sorted numpy arrays.
+
+Every (state, district, crop) series keeps its rows as parallel arrays
+ordered by day number, so a date range is two binary searches and a slice,
+and resampling works on contiguous runs. Query cost follows the size of the
+result, not the size of the dataset.
+
+Arrays are over-allocated and grown by doubling, so appending the latest
+day's rows is amortised O(new rows); back-dated rows fall back to a sorted
+insert into that one series.
+"""
+import base64
+from bisect import insort
+from itertools import islice
+from typing import Dict, Iterator, List, Optional, Tuple
+import numpy as np
+
+from services.series_stats import PRICE_TYPES
+
+SeriesId = Tuple[str, str, str]  # (state, district, crop)
+
+INTERVALS = ("day", "week", "month")
+ROW_FIELDS = ["state", "district", "crop", "date", "min_price", "max_price", "mean_price", "modal_price", "rows"]
+
+
+class SeriesArrays:
+    """Rows of one series: day numbers (ascending) and a (rows, len(PRICE_TYPES)) price matrix."""
+
+    # (days buffer, prices buffer, rows in use), replaced as one reference so a reader never
+    # pairs the days of one version with the prices of another
+    __slots__ = ("_state",)
+
+    def __init__(self, days: np.ndarray, prices: np.ndarray):
+        order = np.argsort(days, kind="stable")
+        days = np.ascontiguousarray(days[order], dtype=np.int64)
+        self._state = (days, np.ascontiguousarray(prices[order], dtype=np.float64), len(days))
+
+    @property
+    def size(self) -> int:
+        return self._state[2]
+
+    @property
+    def days(self) -> np.ndarray:
+        return self.snapshot()[0]
+
+    @property
+    def prices(self) -> np.ndarray:
+        return self.snapshot()[1]
+
+    def snapshot(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Days and prices of the same version; use this rather than .days and .prices when reading both"""
+        days, prices, size = self._state
+        return days[:size], prices[:size]
+
+    def append(self, days: np.ndarray, prices: np.ndarray):
+        """Add rows; readers holding an earlier snapshot keep a consistent (older) view"""
+        order = np.argsort(days, kind="stable")
+        days, prices = days[order], prices[order]
+        buffer_days, buffer_prices, size = self._state
+        if size and days[0] < buffer_days[size - 1]:
+            # Back-dated: insert after existing rows of the same day, copying this series once
+            at = np.searchsorted(buffer_days[:size], days, side="right")
+            merged_days = np.insert(buffer_days[:size], at, days)
+            merged_prices = np.insert(buffer_prices[:size], at, prices, axis=0)
+            self._state = (merged_days, merged_prices, len(merged_days))
+            return
+        end = size + len(days)
+        if end > len(buffer_days):
+            capacity = max(end, 2 * len(buffer_days))
+            grown_days = np.empty(capacity, dtype=np.int64)
+            grown_prices = np.empty((capacity, buffer_prices.shape[1]), dtype=np.float64)
+            grown_days[:size] = buffer_days[:size]
+            grown_prices[:size] = buffer_prices[:size]
+            buffer_days, buffer_prices = grown_days, grown_prices
+        # Written past the published size, so current readers do not see these rows until the swap
+        buffer_days[size:end] = days
+        buffer_prices[size:end] = prices
+        self._state = (buffer_days, buffer_prices, end)
+
+    def window(self, start: Optional[int] = None, end: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Rows with start <= day <= end, by binary search"""
+        days, prices = self.snapshot()
+        lo = 0 if start is None else int(np.searchsorted(days, start, side="left"))
+        hi = len(days) if end is None else int(np.searchsorted(days, end, side="right"))
+        return days[lo:hi], prices[lo:hi]
+
+
+def bucket_starts(days: np.ndarray, interval: str) -> np.ndarray:
+    """First day of the day/week (Monday)/month bucket each day falls in"""
+    if interval == "day":
+        return days
+    if interval == "week":
+        return days - (days + 3) % 7  # 1970-01-01 was a Thursday
+    if interval == "month":
+        return days.astype("datetime64[D]").astype("datetime64[M]").astype("datetime64[D]").astype(np.int64)
+    raise ValueError(f"interval must be one of {', '.join(INTERVALS)}")
+
+
+def resample(days: np.ndarray, prices: np.ndarray, interval: str) -> Dict[str, np.ndarray]:
+    """
+    One row per bucket: lowest Min_Price, highest Max_Price, mean and median
+    ("modal") of Modal_Price, and the number of rows. `days` must be sorted.
+    """
+    buckets = bucket_starts(days, interval)
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(days)]
+    modal = prices[:, PRICE_TYPES.index("modal_price")]
+    counts = ends - starts
+    return {
+        "day": buckets[starts],
+        "min_price": np.minimum.reduceat(prices[:, PRICE_TYPES.index("min_price")], starts),
+        "max_price": np.maximum.reduceat(prices[:, PRICE_TYPES.index("max_price")], starts),
+        "mean_price": np.add.reduceat(modal, starts) / counts,
+        "modal_price": np.array([np.median(modal[s:e]) for s, e in zip(starts, ends)]),
+        "rows": counts,
+    }
+
+
+def encode_cursor(series: SeriesId, day: int) -> str:
+    """Opaque resume point: the next bucket to return (series, bucket start day)"""
+    return base64.urlsafe_b64encode("\x1f".join([*series, str(day)]).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[SeriesId, int]:
+    try:
+        *series, day = base64.urlsafe_b64decode(cursor.encode()).decode().split("\x1f")
+        if len(series) != 3:
+            raise ValueError
+        return tuple(series), int(day)
+    except ValueError:  # also covers binascii.Error and UnicodeDecodeError
+        raise ValueError("Invalid cursor")
+
+
+class PriceStore:
+    """All series of the price dataset, queryable by series filters and date range."""
+
+    INTERVALS = INTERVALS
+    ROW_FIELDS = ROW_FIELDS
+
+    def __init__(self, series: Optional[Dict[SeriesId, SeriesArrays]] = None):
+        self.series: Dict[SeriesId, SeriesArrays] = {}
+        # Sorted series ids overall, per state, per crop and per (state, crop), so match() costs
+        # the size of the narrowest index. Readers copy a list before iterating it (atomic under the GIL)
+        self._ordered: List[SeriesId] = []
+        self._by_state: Dict[str, List[SeriesId]] = {}
+        self._by_crop: Dict[str, List[SeriesId]] = {}
+        self._by_state_crop: Dict[Tuple[str, str], List[SeriesId]] = {}
+        for series_id, arrays in (series or {}).items():
+            self._add_series(series_id, arrays)
+
+    def __len__(self) -> int:
+        return len(self.series)
+
+    def _add_series(self, series: SeriesId, arrays: SeriesArrays):
+        state, _, crop = series
+        insort(self._ordered, series)
+        for index, key in ((self._by_state, state), (self._by_crop, crop), (self._by_state_crop, (state, crop))):
+            insort(index.setdefault(key, []), series)
+        self.series[series] = arrays
+
+    def get(self, state: str, district: str, crop: str) -> Optional[SeriesArrays]:
+        return self.series.get((state, district, crop))
+
+    def append(self, series: SeriesId, days: np.ndarray, prices: np.ndarray):
+        existing = self.series.get(series)
+        if existing is None:
+            self._add_series(series, SeriesArrays(days, prices))
+        else:
+            existing.append(days, prices)
+
+    def match(self, state: Optional[str] = None, district: Optional[str] = None, crop: Optional[str] = None) -> List[SeriesId]:
+        """Series ids matching the filters (None = any), in sorted order"""
+        if state is not None and district is not None and crop is not None:
+            return [(state, district, crop)] if (state, district, crop) in self.series else []
+        if state is not None and crop is not None:
+            candidates = self._by_state_crop.get((state, crop), [])
+        elif state is not None:
+            candidates = self._by_state.get(state, [])
+        elif crop is not None:
+            candidates = self._by_crop.get(crop, [])
+        else:
+            candidates = self._ordered
+        if district is None:
+            return list(candidates)
+        return [series for series in list(candidates) if series[1] == district]
+
+    def rows(self, state: str, district: Optional[str], crop: str, start: Optional[int] = None,
+             end: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Raw rows of one series, or of every district of a state/crop when district is None, merged by day"""
+        parts = [self.series[series].window(start, end) for series in self.match(state, district, crop)]
+        if not parts:
+            return np.empty(0, dtype=np.int64), np.empty((0, len(PRICE_TYPES)))
+        if len(parts) == 1:
+            return parts[0]
+        days = np.concatenate([days for days, _ in parts])
+        order = np.argsort(days, kind="stable")
+        return days[order], np.concatenate([prices for _, prices in parts])[order]
+
+    def daily_totals(self, state: str, district: Optional[str], crop: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(days, per-day price sums, rows per day) for SeriesStats.from_daily"""
+        days, prices = self.rows(state, district, crop)
+        unique, starts = np.unique(days, return_index=True)
+        return unique, np.add.reduceat(prices, starts, axis=0) if len(days) else prices, np.diff(np.r_[starts, len(days)])
+
+    def query(self, state: Optional[str] = None, district: Optional[str] = None, crop: Optional[str] = None,
+              start: Optional[int] = None, end: Optional[int] = None, interval: str = "day",
+              cursor: Optional[str] = None) -> Iterator[Tuple[SeriesId, int, Dict]]:
+        """
+        Resampled rows in (series, date) order, starting at `cursor` if given.
+
+        Yields (series, bucket start day, row) one bucket at a time, so callers
+        can stop at a page limit and pass the first row they did not return to
+        encode_cursor() as the next cursor.
+        """
+        if interval not in INTERVALS:
+            raise ValueError(f"interval must be one of {', '.join(INTERVALS)}")
+        resume: Optional[Tuple[SeriesId, int]] = decode_cursor(cursor) if cursor else None
+        for series in self.match(state, district, crop):
+            series_start = start
+            if resume is not None:
+                if series < resume[0]:
+                    continue
+                if series == resume[0]:
+                    # The cursor is a bucket start; any row on or after it is in that bucket or later
+                    series_start = resume[1] if start is None else max(start, resume[1])
+            days, prices = self.series[series].window(series_start, end)
+            if not len(days):
+                continue
+            buckets = resample(days, prices, interval)
+            for i, day in enumerate(buckets["day"].tolist()):
+                yield series, day, {
+                    "state": series[0],
+                    "district": series[1],
+                    "crop": series[2],
+                    "date": str(np.datetime64(day, "D")),
+                    "min_price": round(float(buckets["min_price"][i]), 2),
+                    "max_price": round(float(buckets["max_price"][i]), 2),
+                    "mean_price": round(float(buckets["mean_price"][i]), 2),
+                    "modal_price": round(float(buckets["modal_price"][i]), 2),
+                    "rows": int(buckets["rows"][i]),
+                }
+
+    def page(self, limit: int, cursor: Optional[str] = None, **filters) -> Tuple[List[Dict], Optional[str]]:
+        """Up to `limit` query() rows and the cursor of the next one (None on the last page)"""
+        results = list(islice(self.query(cursor=cursor, **filters), limit + 1))
+        next_cursor = encode_cursor(results[limit][0], results[limit][1]) if len(results) > limit else None
+        return [row for _, _, row in results[:limit]], next_cursor
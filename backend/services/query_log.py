@@ -0,0 +1,328 @@
+import asyncio
+import json
+import logging
+import os
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+from sqlalchemy import insert
+from sqlalchemy.exc import InterfaceError, OperationalError, TimeoutError as PoolTimeoutError
+from database import AsyncSessionLocal
+from models.query import QueryLog, ImageUpload
+from utils.file_lock import file_lock
+
+logger = logging.getLogger(__name__)
+
+QUERY_LOG_ENABLED = os.getenv("QUERY_LOG_ENABLED", "1").lower() in ("1", "true", "yes")
+QUERY_LOG_BATCH_SIZE = int(os.getenv("QUERY_LOG_BATCH_SIZE", "100"))
+QUERY_LOG_FLUSH_INTERVAL = float(os.getenv("QUERY_LOG_FLUSH_INTERVAL", "2.0"))
+QUERY_LOG_MAX_QUEUE = int(os.getenv("QUERY_LOG_MAX_QUEUE", "10000"))
+# What to do when the queue is full: drop_oldest, drop_new, or spill (append to a
+# JSONL file that is replayed into the database once writes succeed again)
+QUERY_LOG_OVERFLOW = os.getenv("QUERY_LOG_OVERFLOW", "drop_oldest")
+QUERY_LOG_SPILL_PATH = os.getenv("QUERY_LOG_SPILL_PATH", "./query_log.spill.jsonl")
+# Records the database rejects on their own (bad values, constraint errors) are set aside here, never replayed
+QUERY_LOG_DEAD_LETTER_PATH = os.getenv("QUERY_LOG_DEAD_LETTER_PATH", "./query_log.dead.jsonl")
+
+QUERY_COLUMNS = ("user_id", "query_type", "original_query", "translated_query", "response", "confidence_score", "language", "created_at")
+IMAGE_COLUMNS = ("user_id", "filename", "file_path", "file_size", "disease_detected", "confidence_score", "created_at")
+
+# Errors that mean the database is unreachable rather than that a record is bad
+OUTAGE_ERRORS = (OperationalError, InterfaceError, PoolTimeoutError, OSError, asyncio.TimeoutError)
+
+
+def _clip(value, length: int) -> Optional[str]:
+    """String columns: None stays None, anything else is stringified and cut to the column size"""
+    return None if value is None else str(value)[:length]
+
+
+def _number(value, kind):
+    try:
+        return None if value is None else kind(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _append_jsonl(path: Path, records: List[Dict], extra: Optional[Dict] = None):
+    # Every worker shares the spill and dead-letter files; the lock keeps appends whole and
+    # ordered against _take_jsonl
+    lines = "".join(json.dumps({**record, **(extra or {})}, default=lambda v: v.isoformat()) + "\n" for record in records)
+    with path.open("a", encoding="utf-8") as f, file_lock(f):
+        f.write(lines)
+
+
+def _take_jsonl(path: Path) -> List[Dict]:
+    """Read and empty a spill file under its lock, so no other worker's append lands in between"""
+    if not path.exists():
+        return []
+    with path.open("r+", encoding="utf-8") as f, file_lock(f):
+        lines = f.readlines()
+        f.truncate(0)
+    records = []
+    for line in lines:
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        record["created_at"] = datetime.fromisoformat(record["created_at"])
+        records.append(record)
+    return records
+
+
+class QueryLogWriter:
+    """
+    Write-behind logger for user interactions.
+
+    Handlers call log_chat/log_image, which only append to an in-memory queue.
+    A background task drains the queue into the queries/image_uploads tables
+    with one multi-row INSERT per table, whenever batch_size records are
+    waiting or flush_interval has passed.
+
+    When a batch fails because of one bad record, the batch is retried row
+    by row and only the rejected records go to the dead-letter file; when the
+    database is unreachable, the overflow policy decides (drop or spill).
+    """
+
+    def __init__(
+        self,
+        batch_size: int = QUERY_LOG_BATCH_SIZE,
+        flush_interval: float = QUERY_LOG_FLUSH_INTERVAL,
+        max_queue: int = QUERY_LOG_MAX_QUEUE,
+        overflow: str = QUERY_LOG_OVERFLOW,
+        spill_path: str = QUERY_LOG_SPILL_PATH,
+        dead_letter_path: str = QUERY_LOG_DEAD_LETTER_PATH,
+    ):
+        if overflow not in ("drop_oldest", "drop_new", "spill"):
+            raise ValueError(f"Unknown QUERY_LOG_OVERFLOW policy: {overflow}")
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.overflow = overflow
+        self.spill_path = Path(spill_path)
+        self.dead_letter_path = Path(dead_letter_path)
+        self._queue: deque = deque()
+        # Records over max_queue under the spill policy, written out by the background task
+        self._overflow: List[Dict] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"enqueued": 0, "written": 0, "dropped": 0, "spilled": 0, "failed_flushes": 0, "batches": 0, "dead_lettered": 0}
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self):
+        if self.running:
+            return
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        await self._replay_spill()
+
+    async def stop(self):
+        """Stop the background task and flush whatever is still queued"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        while self._queue:
+            await self._flush(self._take_batch())
+        await self._spill_overflow()
+
+    def log_chat(self, user_id: Optional[int], query: str, response: str, language: Optional[str] = None,
+                 translated_query: Optional[str] = None, confidence: Optional[float] = None):
+        self.enqueue({
+            "kind": "chat",
+            "user_id": _number(user_id, int),
+            "query_type": "chat",
+            "original_query": str(query or ""),
+            "translated_query": None if translated_query is None else str(translated_query),
+            "response": str(response or ""),
+            "confidence_score": _number(confidence, float),
+            "language": _clip(language, 10),
+        })
+
+    def log_image(self, user_id: Optional[int], filename: Optional[str], response: str, language: Optional[str] = None,
+                  disease: Optional[str] = None, confidence: Optional[float] = None, file_size: Optional[int] = None):
+        self.enqueue({
+            "kind": "image",
+            "user_id": _number(user_id, int),
+            "query_type": "image",
+            "original_query": f"Image upload: {filename}",
+            "response": str(response or ""),
+            "confidence_score": _number(confidence, float),
+            "language": _clip(language, 10),
+            "filename": _clip(filename, 255),
+            "file_size": _number(file_size, int),
+            "disease_detected": _clip(disease, 255),
+        })
+
+    def enqueue(self, record: Dict):
+        """Non-blocking; applies the overflow policy when the queue is full"""
+        if not self.running:
+            return
+        record.setdefault("created_at", datetime.utcnow())
+        if len(self._queue) >= self.max_queue:
+            if self.overflow == "drop_new":
+                self.stats["dropped"] += 1
+                return
+            if self.overflow == "spill":
+                # Written to disk by the background task, not here on the event loop
+                self._overflow.append(record)
+                if self._wakeup is not None:
+                    self._wakeup.set()
+                return
+            self._queue.popleft()
+            self.stats["dropped"] += 1
+        self._queue.append(record)
+        self.stats["enqueued"] += 1
+        if self._wakeup is not None and len(self._queue) >= self.batch_size:
+            self._wakeup.set()
+
+    def _take_batch(self) -> List[Dict]:
+        batch = []
+        while self._queue and len(batch) < self.batch_size:
+            batch.append(self._queue.popleft())
+        return batch
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self._spill_overflow()
+            while self._queue:
+                await self._flush(self._take_batch())
+                if len(self._queue) < self.batch_size:
+                    break
+
+    async def _flush(self, batch: List[Dict]) -> bool:
+        if not batch:
+            return True
+        try:
+            await self._write(batch)
+        except Exception as e:
+            self.stats["failed_flushes"] += 1
+            logger.error(f"Query log flush of {len(batch)} records failed: {str(e)}")
+            pending = await self._salvage(batch, e)
+            if pending:
+                await self._handle_unwritten(pending)
+                return False
+        else:
+            self.stats["written"] += len(batch)
+            self.stats["batches"] += 1
+        if self.overflow == "spill" and self._spill_pending():
+            await self._replay_spill()
+        return True
+
+    async def _salvage(self, batch: List[Dict], error: Exception) -> List[Dict]:
+        """
+        After a failed batch write: retry row by row and dead-letter the rows the
+        database rejects. Returns the rows left unwritten because it is unreachable.
+        """
+        if isinstance(error, OUTAGE_ERRORS):
+            return batch
+        for i, record in enumerate(batch):
+            try:
+                await self._write([record])
+            except Exception as e:
+                if isinstance(e, OUTAGE_ERRORS):
+                    return batch[i:]
+                await self._dead_letter(record, e)
+            else:
+                self.stats["written"] += 1
+        return []
+
+    async def _handle_unwritten(self, records: List[Dict]):
+        if self.overflow == "spill":
+            await self._spill(records)
+        else:
+            self.stats["dropped"] += len(records)
+
+    async def _write(self, batch: List[Dict]):
+        query_rows = [{column: record.get(column) for column in QUERY_COLUMNS} for record in batch]
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                insert(QueryLog).returning(QueryLog.id, sort_by_parameter_order=True),
+                query_rows,
+            )
+            query_ids = result.scalars().all()
+            image_rows = [
+                dict({column: record.get(column) for column in IMAGE_COLUMNS}, query_id=query_id)
+                for record, query_id in zip(batch, query_ids)
+                if record["kind"] == "image"
+            ]
+            if image_rows:
+                await session.execute(insert(ImageUpload), image_rows)
+            await session.commit()
+
+    def _spill_pending(self) -> bool:
+        # Replays empty the file rather than removing it, so look at its size
+        try:
+            return self.spill_path.stat().st_size > 0
+        except OSError:
+            return False
+
+    async def _spill(self, records: List[Dict]):
+        try:
+            await asyncio.to_thread(_append_jsonl, self.spill_path, records)
+            self.stats["spilled"] += len(records)
+        except OSError as e:
+            logger.error(f"Could not spill query log records: {str(e)}")
+            self.stats["dropped"] += len(records)
+
+    async def _spill_overflow(self):
+        if self._overflow:
+            records, self._overflow = self._overflow, []
+            await self._spill(records)
+
+    async def _dead_letter(self, record: Dict, error: Exception):
+        logger.error(f"Query log record rejected, moved to {self.dead_letter_path}: {str(error)}")
+        try:
+            await asyncio.to_thread(_append_jsonl, self.dead_letter_path, [record], {"error": str(error)[:500]})
+            self.stats["dead_lettered"] += 1
+        except OSError as e:
+            logger.error(f"Could not write query log dead letter: {str(e)}")
+            self.stats["dropped"] += 1
+
+    async def _replay_spill(self):
+        """Move spilled records back into the database, oldest first"""
+        try:
+            records = await asyncio.to_thread(_take_jsonl, self.spill_path)
+        except OSError as e:
+            logger.error(f"Could not read spilled query log records: {str(e)}")
+            return
+        if not records:
+            return
+        logger.info(f"Replaying {len(records)} spilled query log records")
+        for start in range(0, len(records), self.batch_size):
+            chunk = records[start:start + self.batch_size]
+            try:
+                await self._write(chunk)
+            except Exception as e:
+                logger.error(f"Query log replay failed: {str(e)}")
+                pending = await self._salvage(chunk, e)
+                if pending:
+                    # Still unreachable: keep the rest for the next successful flush
+                    await self._spill(pending + records[start + self.batch_size:])
+                    return
+                continue
+            self.stats["written"] += len(chunk)
+
+    def report(self) -> Dict:
+        return {
+            "enabled": self.running,
+            "queued": len(self._queue),
+            "overflow_pending": len(self._overflow),
+            "max_queue": self.max_queue,
+            "overflow_policy": self.overflow,
+            **self.stats,
+        }
+
+
+query_logger = QueryLogWriter()
@@ -0,0 +1,190 @@
+"""
+Per-series running aggregates for O(1) trend and volatility reads.
+
+Each price series (state, district, crop) is tracked as a daily stream: the
+value for a day is the mean over that day's rows (several markets report the
+same day). For every price type a RunningStats keeps the least-squares sums
+(Σx, Σy, Σxy, Σx², with x = days since the series' first day) over the whole
+history plus the last STATS_WINDOW daily values with their running sum and
+sum of squares.
+
+Appending rows for a new latest day, or more rows for the current latest day,
+updates these in O(1). Rows for an earlier day would change a point in the
+middle of the history, so the series is rebuilt from the dataset instead.
+"""
+import math
+import os
+from collections import deque
+from datetime import date, timedelta
+from typing import TYPE_CHECKING, Dict, Optional, Sequence
+from dotenv import load_dotenv
+
+if TYPE_CHECKING:
+    import numpy as np
+
+load_dotenv()
+
+# Rolling window (in daily points) for the average price and volatility
+STATS_WINDOW = int(os.getenv("STATS_WINDOW", "30"))
+
+PRICE_TYPES = ("min_price", "modal_price", "max_price")
+
+
+class RunningStats:
+    """Incremental least-squares sums and rolling-window moments for one daily value stream."""
+
+    __slots__ = ("origin", "last_x", "n", "sx", "sy", "sxy", "sxx", "window", "wsum", "wsq", "_pushes")
+
+    def __init__(self, window: int = STATS_WINDOW):
+        self.origin: Optional[int] = None
+        self.last_x = 0
+        self.n = 0
+        self.sx = self.sy = self.sxy = self.sxx = 0.0
+        self.window = deque(maxlen=window)
+        self.wsum = self.wsq = 0.0
+        self._pushes = 0
+
+    @classmethod
+    def from_arrays(cls, days: "np.ndarray", values: "np.ndarray", window: int = STATS_WINDOW) -> "RunningStats":
+        """Bulk initialisation from a daily series (ascending day numbers), vectorised"""
+        stats = cls(window)
+        if len(days) == 0:
+            return stats
+        x = (days - days[0]).astype(float)
+        values = values.astype(float)
+        stats.origin = int(days[0])
+        stats.last_x = int(x[-1])
+        stats.n = len(values)
+        stats.sx, stats.sy = float(x.sum()), float(values.sum())
+        stats.sxy, stats.sxx = float(x @ values), float(x @ x)
+        stats.window.extend(values[-window:].tolist())
+        stats._resum()
+        return stats
+
+    def _resum(self):
+        # Exact window sums; called every `maxlen` pushes so float error cannot accumulate
+        self.wsum = math.fsum(self.window)
+        self.wsq = math.fsum(v * v for v in self.window)
+
+    def push_day(self, day: int, value: float):
+        """Value for a day after every day seen so far"""
+        if self.origin is None:
+            self.origin = day
+        x = day - self.origin
+        self.last_x = x
+        self.n += 1
+        self.sx += x
+        self.sxx += x * x
+        self.sy += value
+        self.sxy += x * value
+        if len(self.window) == self.window.maxlen:
+            oldest = self.window[0]
+            self.wsum -= oldest
+            self.wsq -= oldest * oldest
+        self.window.append(value)
+        self.wsum += value
+        self.wsq += value * value
+        self._pushes += 1
+        if self._pushes % self.window.maxlen == 0:
+            self._resum()
+
+    def replace_last(self, value: float):
+        """The latest day's value changed (more rows arrived for it)"""
+        old = self.window[-1]
+        delta = value - old
+        self.sy += delta
+        self.sxy += self.last_x * delta
+        self.window[-1] = value
+        self.wsum += delta
+        self.wsq += value * value - old * old
+
+    def slope(self) -> float:
+        """Least-squares change per day over the whole history"""
+        denominator = self.n * self.sxx - self.sx * self.sx
+        if self.n < 2 or denominator == 0:
+            return 0.0
+        return (self.n * self.sxy - self.sx * self.sy) / denominator
+
+    def intercept(self) -> float:
+        return (self.sy - self.slope() * self.sx) / self.n if self.n else 0.0
+
+    def mean(self) -> float:
+        """Average of the last STATS_WINDOW daily values"""
+        return self.wsum / len(self.window) if self.window else 0.0
+
+    def volatility(self) -> float:
+        """Population standard deviation over the window (same as np.std)"""
+        k = len(self.window)
+        if not k:
+            return 0.0
+        return math.sqrt(max(0.0, self.wsq / k - (self.wsum / k) ** 2))
+
+
+class SeriesStats:
+    """Running aggregates for one price series across all price types."""
+
+    __slots__ = ("rows", "first_day", "last_day", "last_sums", "last_count", "streams")
+
+    def __init__(self, window: int = STATS_WINDOW):
+        self.rows = 0
+        self.first_day: Optional[int] = None
+        self.last_day: Optional[int] = None
+        self.last_sums = [0.0] * len(PRICE_TYPES)
+        self.last_count = 0
+        self.streams: Dict[str, RunningStats] = {price_type: RunningStats(window) for price_type in PRICE_TYPES}
+
+    @classmethod
+    def from_daily(cls, days: "np.ndarray", sums: "np.ndarray", counts: "np.ndarray", window: int = STATS_WINDOW) -> "SeriesStats":
+        """days ascending; sums shaped (days, len(PRICE_TYPES)); counts = rows per day"""
+        stats = cls(window)
+        if len(days) == 0:
+            return stats
+        means = sums / counts[:, None]
+        stats.streams = {
+            price_type: RunningStats.from_arrays(days, means[:, i], window) for i, price_type in enumerate(PRICE_TYPES)
+        }
+        stats.rows = int(counts.sum())
+        stats.first_day, stats.last_day = int(days[0]), int(days[-1])
+        stats.last_sums = [float(v) for v in sums[-1]]
+        stats.last_count = int(counts[-1])
+        return stats
+
+    def add_day_rows(self, day: int, sums: Sequence[float], count: int) -> bool:
+        """
+        Fold `count` rows for `day` (with per-price-type `sums`) into the aggregates.
+
+        Returns False when the day is earlier than the latest one; the caller
+        must rebuild the series, since a point inside the history changed.
+        """
+        if self.last_day is not None and day < self.last_day:
+            return False
+        if self.last_day is None or day > self.last_day:
+            if self.first_day is None:
+                self.first_day = day
+            self.last_day = day
+            self.last_sums = [float(v) for v in sums]
+            self.last_count = count
+            for i, price_type in enumerate(PRICE_TYPES):
+                self.streams[price_type].push_day(day, self.last_sums[i] / count)
+        else:
+            self.last_sums = [total + float(v) for total, v in zip(self.last_sums, sums)]
+            self.last_count += count
+            for i, price_type in enumerate(PRICE_TYPES):
+                self.streams[price_type].replace_last(self.last_sums[i] / self.last_count)
+        self.rows += count
+        return True
+
+    def summary(self, price_type: str) -> Dict:
+        stream = self.streams[price_type]
+        slope = stream.slope()
+        return {
+            "trend": "Increasing" if slope > 0 else "Decreasing",
+            "slope_per_day": slope,
+            "avg_price": stream.mean(),
+            "volatility": stream.volatility(),
+            "window": len(stream.window),
+            "days": stream.n,
+            "rows": self.rows,
+            "first_date": str(date(1970, 1, 1) + timedelta(days=self.first_day)) if self.first_day is not None else None,
+            "last_date": str(date(1970, 1, 1) + timedelta(days=self.last_day)) if self.last_day is not None else None,
+        }
@@ -0,0 +1,108 @@
+from fastapi import Depends, HTTPException
+from fastapi.security import APIKeyHeader, HTTPBearer, HTTPAuthorizationCredentials
+from cachetools import TLRUCache, TTLCache
+from sqlalchemy import event
+from sqlalchemy.future import select
+from jose import JWTError
+from typing import Optional
+import hashlib
+import hmac
+import time
+import os
+from database import AsyncSessionLocal
+from models.user import User
+from schemas.user import UserProfile
+from utils.security import decode_access_token
+
+# Decoded claims are reused for at most CLAIMS_CACHE_TTL seconds and never past the
+# token's own exp. User rows are dropped when they change in this process; other workers
+# only hear about it through USER_CACHE_TTL, which bounds how stale a profile can get.
+CLAIMS_CACHE_TTL = int(os.getenv("CLAIMS_CACHE_TTL", "300"))
+CLAIMS_CACHE_SIZE = int(os.getenv("CLAIMS_CACHE_SIZE", "4096"))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "2048"))
+USER_CACHE_TTL = int(os.getenv("USER_CACHE_TTL", "30"))
+
+# Operator access (monitoring, price ingest, backtests): accounts listed in ADMIN_USERNAMES,
+# or a service credential sent as X-Admin-Token. Both empty means no one has access.
+ADMIN_USERNAMES = {name.strip() for name in os.getenv("ADMIN_USERNAMES", "").split(",") if name.strip()}
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+def _claims_ttu(key, claims, now):
+    return min(now + CLAIMS_CACHE_TTL, claims.get("exp", now))
+
+claims_cache = TLRUCache(maxsize=CLAIMS_CACHE_SIZE, ttu=_claims_ttu, timer=time.time)
+user_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
+bearer_scheme = HTTPBearer(auto_error=False)
+admin_token_header = APIKeyHeader(name="X-Admin-Token", auto_error=False)
+
+def _unauthorized(detail: str = "Invalid or expired token"):
+    return HTTPException(status_code=401, detail=detail, headers={"WWW-Authenticate": "Bearer"})
+
+def get_token_claims(token: str) -> dict:
+    """Decode a JWT, serving repeat presentations of the same token from cache"""
+    # Key on a digest so raw bearer tokens are not kept in memory
+    key = hashlib.sha256(token.encode()).hexdigest()
+    claims = claims_cache.get(key)
+    if claims is None:
+        try:
+            claims = decode_access_token(token)
+        except JWTError:
+            raise _unauthorized()
+        claims_cache[key] = claims
+    return claims
+
+async def load_user(username: str) -> Optional[UserProfile]:
+    profile = user_cache.get(username)
+    if profile is not None:
+        return profile
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(select(User).where(User.username == username))
+        user = result.scalar_one_or_none()
+    if user is None:
+        return None
+    profile = UserProfile(id=user.id, username=user.username, language_preference=user.language_preference)
+    user_cache[username] = profile
+    return profile
+
+def invalidate_user(username: str):
+    user_cache.pop(username, None)
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_cached_user(mapper, connection, target):
+    invalidate_user(target.username)
+
+async def get_optional_user(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer_scheme),
+) -> Optional[UserProfile]:
+    """Authenticated user if a bearer token was sent; None for anonymous requests"""
+    if credentials is None:
+        return None
+    claims = get_token_claims(credentials.credentials)
+    username = claims.get("sub")
+    if not username:
+        raise _unauthorized()
+    user = await load_user(username)
+    if user is None:
+        raise _unauthorized("User no longer exists")
+    return user
+
+async def get_current_user(user: Optional[UserProfile] = Depends(get_optional_user)) -> UserProfile:
+    """Like get_optional_user, but the request must be authenticated"""
+    if user is None:
+        raise _unauthorized("Not authenticated")
+    return user
+
+async def get_admin(
+    token: Optional[str] = Depends(admin_token_header),
+    user: Optional[UserProfile] = Depends(get_optional_user),
+) -> Optional[UserProfile]:
+    """Operator-only endpoints: a valid X-Admin-Token, or a signed-in user listed in ADMIN_USERNAMES"""
+    if token and ADMIN_TOKEN and hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+        return user
+    if user is None:
+        raise _unauthorized("Not authenticated")
+    if user.username not in ADMIN_USERNAMES:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return user
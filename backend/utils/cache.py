@@ -0,0 +1,118 @@
+import json
+import logging
+import os
+import time
+from typing import Any, Optional
+from cachetools import TLRUCache
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# redis://host:6379/0 shares cached results between workers (and instances); empty keeps them per process
+CACHE_URL = os.getenv("CACHE_URL", "")
+CACHE_PREFIX = os.getenv("CACHE_PREFIX", "agriagent:")
+LOCAL_CACHE_SIZE = int(os.getenv("LOCAL_CACHE_SIZE", "2048"))
+
+
+class CacheBackend:
+    """Async key/value cache for JSON-serializable values with per-key TTLs."""
+
+    name = "base"
+
+    async def get(self, key: str) -> Optional[Any]:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: Any, ttl: int):
+        raise NotImplementedError
+
+    async def delete(self, key: str):
+        raise NotImplementedError
+
+    async def clear(self):
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class LocalCache(CacheBackend):
+    """
+    In-process stand-in for the shared cache (single worker, tests).
+
+    Values go through JSON like they would on the wire, so code that works
+    here does not break once it talks to Redis.
+    """
+
+    name = "local"
+
+    def __init__(self, maxsize: int = LOCAL_CACHE_SIZE):
+        # Entries are (expires_at, payload); the TLRU evicts each one at its own deadline
+        self.entries = TLRUCache(maxsize=maxsize, ttu=lambda key, value, now: value[0], timer=time.time)
+
+    async def get(self, key: str) -> Optional[Any]:
+        entry = self.entries.get(key)
+        return json.loads(entry[1]) if entry is not None else None
+
+    async def set(self, key: str, value: Any, ttl: int):
+        self.entries[key] = (time.time() + ttl, json.dumps(value))
+
+    async def delete(self, key: str):
+        self.entries.pop(key, None)
+
+    async def clear(self):
+        self.entries.clear()
+
+
+class RedisCache(CacheBackend):
+    """Cache shared by every worker through Redis; errors degrade to cache misses."""
+
+    name = "redis"
+
+    def __init__(self, url: str, prefix: str = CACHE_PREFIX):
+        import redis.asyncio as redis
+        self.client = redis.from_url(url)
+        self.prefix = prefix
+
+    async def get(self, key: str) -> Optional[Any]:
+        try:
+            payload = await self.client.get(self.prefix + key)
+        except Exception as e:
+            logger.warning(f"Cache get failed: {str(e)}")
+            return None
+        return json.loads(payload) if payload is not None else None
+
+    async def set(self, key: str, value: Any, ttl: int):
+        try:
+            await self.client.set(self.prefix + key, json.dumps(value), ex=ttl)
+        except Exception as e:
+            logger.warning(f"Cache set failed: {str(e)}")
+
+    async def delete(self, key: str):
+        try:
+            await self.client.delete(self.prefix + key)
+        except Exception as e:
+            logger.warning(f"Cache delete failed: {str(e)}")
+
+    async def clear(self):
+        try:
+            async for key in self.client.scan_iter(match=self.prefix + "*"):
+                await self.client.delete(key)
+        except Exception as e:
+            logger.warning(f"Cache clear failed: {str(e)}")
+
+    async def close(self):
+        await self.client.close()
+
+
+def create_cache(url: str = CACHE_URL) -> CacheBackend:
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        try:
+            return RedisCache(url)
+        except ImportError:
+            logger.warning("CACHE_URL points at Redis but the redis package is not installed; using a local cache")
+    return LocalCache()
+
+
+shared_cache = create_cache()
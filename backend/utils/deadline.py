@@ -0,0 +1,115 @@
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+# Whole-request budget for the chat pipeline, in seconds
+CHAT_DEADLINE_SECONDS = float(os.getenv("CHAT_DEADLINE_SECONDS", "8"))
+
+# Per-stage ceilings; a stage also never gets more than what is left of the deadline
+DEFAULT_STAGE_BUDGETS = {
+    "location": 1.5,
+    "weather": 1.5,
+    "language": 1.0,
+    "translate": 1.0,
+    "dhenu": 4.0,
+    "gemini": 4.0,
+    "enhance": 2.5,
+    "repair": 1.0,
+    "translate_back": 1.5,
+    "tts": 1.5,
+}
+
+
+def parse_stage_budgets(spec: Optional[str]) -> Dict[str, float]:
+    """'dhenu=5,tts=1' -> {'dhenu': 5.0, 'tts': 1.0} on top of the defaults"""
+    budgets = dict(DEFAULT_STAGE_BUDGETS)
+    for item in (spec or "").split(","):
+        if "=" not in item:
+            continue
+        stage, seconds = item.split("=", 1)
+        try:
+            budgets[stage.strip()] = float(seconds)
+        except ValueError:
+            logger.warning(f"Ignoring invalid stage budget: {item}")
+    return budgets
+
+
+CHAT_STAGE_BUDGETS = parse_stage_budgets(os.getenv("CHAT_STAGE_BUDGETS"))
+
+
+class Deadline:
+    """
+    Request deadline split into per-stage budgets.
+
+    run() awaits a stage for at most min(stage budget, time left). A stage that
+    runs out of time is cancelled, recorded in `degraded`, and its fallback is
+    returned so the pipeline can carry on with a reduced answer.
+    """
+
+    def __init__(self, total: float = CHAT_DEADLINE_SECONDS, budgets: Optional[Dict[str, float]] = None):
+        self.total = total
+        self.budgets = budgets if budgets is not None else CHAT_STAGE_BUDGETS
+        self.started = time.perf_counter()
+        self.degraded: List[str] = []
+        self.timings: Dict[str, float] = {}
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def remaining(self) -> float:
+        return max(0.0, self.total - self.elapsed())
+
+    def budget(self, stage: str) -> float:
+        return min(self.budgets.get(stage, self.total), self.remaining())
+
+    def degrade(self, stage: str):
+        if stage not in self.degraded:
+            self.degraded.append(stage)
+
+    async def run(self, stage: str, coro: Awaitable, fallback: Union[Any, Callable[[], Any]] = None) -> Any:
+        timeout = self.budget(stage)
+        start = time.perf_counter()
+        try:
+            if timeout <= 0:
+                raise asyncio.TimeoutError
+            return await asyncio.wait_for(coro, timeout=timeout)
+        except asyncio.TimeoutError:
+            self.degrade(stage)
+            logger.warning(f"Stage '{stage}' exceeded its {timeout:.2f}s budget; degrading")
+            return fallback() if callable(fallback) else fallback
+        finally:
+            if asyncio.iscoroutine(coro):
+                coro.close()  # never awaited when the budget was already spent
+            self.timings[stage] = round((time.perf_counter() - start) * 1000, 1)
+
+    def report(self) -> Dict:
+        return {
+            "deadline_ms": self.total * 1000,
+            "elapsed_ms": round(self.elapsed() * 1000, 1),
+            "stage_timings_ms": dict(self.timings),
+            "degraded_stages": list(self.degraded),
+        }
+
+
+class LatencyTracker:
+    """Rolling window of recent latencies, used to pick hedging delays."""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.samples = deque(maxlen=window)
+        self.min_samples = min_samples
+
+    def record(self, seconds: float):
+        self.samples.append(seconds)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        """pct-th percentile of the window, or None until min_samples are in"""
+        if len(self.samples) < self.min_samples:
+            return None
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+        return ordered[index]
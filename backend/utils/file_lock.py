@@ -0,0 +1,20 @@
+"""Advisory locks for files that several gunicorn workers append to and read."""
+from contextlib import contextmanager
+from typing import IO
+
+try:
+    import fcntl
+except ImportError:  # Windows: no gunicorn there, so one process owns the file
+    fcntl = None
+
+
+@contextmanager
+def file_lock(f: IO, exclusive: bool = True):
+    """flock an open file for the duration of the block (no-op without fcntl)"""
+    if fcntl is not None:
+        fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+    try:
+        yield
+    finally:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_UN)
@@ -0,0 +1,98 @@
+from typing import Optional, Set, Tuple
+
+# Unicode blocks of the scripts our users write in, mapped to the languages that
+# use them. A script with a single language settles detection locally; shared
+# scripts (Devanagari, Bengali, Arabic) still need a hint or a remote check.
+SCRIPT_RANGES = [
+    (0x0900, 0x097F, frozenset({"hi", "mr", "ne"})),   # Devanagari
+    (0x0980, 0x09FF, frozenset({"bn", "as"})),         # Bengali-Assamese
+    (0x0A00, 0x0A7F, frozenset({"pa"})),               # Gurmukhi
+    (0x0A80, 0x0AFF, frozenset({"gu"})),               # Gujarati
+    (0x0B00, 0x0B7F, frozenset({"or"})),               # Odia
+    (0x0B80, 0x0BFF, frozenset({"ta"})),               # Tamil
+    (0x0C00, 0x0C7F, frozenset({"te"})),               # Telugu
+    (0x0C80, 0x0CFF, frozenset({"kn"})),               # Kannada
+    (0x0D00, 0x0D7F, frozenset({"ml"})),               # Malayalam
+    (0x0600, 0x06FF, frozenset({"ur", "ar", "fa"})),   # Arabic
+]
+LATIN = frozenset({"en"})
+
+# Share of letters the dominant script must cover before we trust it
+DOMINANT_SCRIPT_SHARE = 0.8
+
+
+def normalize_language(code: Optional[str]) -> Optional[str]:
+    """'hi-IN' / 'HI' -> 'hi'; empty values -> None"""
+    if not code or not code.strip():
+        return None
+    return code.strip().lower().replace("_", "-").split("-")[0]
+
+
+def _script_of(ch: str) -> Optional[frozenset]:
+    cp = ord(ch)
+    if cp < 0x0250:
+        return LATIN if ch.isalpha() else None
+    for start, end, languages in SCRIPT_RANGES:
+        if start <= cp <= end:
+            return languages
+    return None
+
+
+def script_candidates(text: str) -> Tuple[Optional[Set[str]], bool]:
+    """
+    Languages the text could be written in, judged by script alone.
+
+    Returns (candidates, has_letters). candidates is None when no script
+    dominates (mixed or unknown scripts); has_letters is False for input
+    such as numbers or emoji, where the script says nothing.
+    """
+    counts = {}
+    letters = 0
+    for ch in text:
+        # Indic vowel signs are combining marks, not alpha, so count by block too
+        script = _script_of(ch)
+        if script is None and not ch.isalpha():
+            continue
+        letters += 1
+        if script is not None:
+            counts[script] = counts.get(script, 0) + 1
+    if letters == 0:
+        return None, False
+    script, count = max(counts.items(), key=lambda item: item[1], default=(None, 0))
+    if script is None or count / letters < DOMINANT_SCRIPT_SHARE:
+        return None, True
+    return set(script), True
+
+
+def resolve_language(text: str, requested: Optional[str] = None, preferred: Optional[str] = None) -> Tuple[Optional[str], str]:
+    """
+    Pick the message language without a network call where possible.
+
+    Hints are tried in order: the request's language, then the user's stored
+    preference. The script heuristic confirms a hint, or decides on its own
+    when the script belongs to exactly one non-Latin language. Returns
+    (language, source); language is None when the signals disagree or are
+    ambiguous and remote detection should settle it.
+    """
+    hints = [(code, source) for code, source in
+             ((normalize_language(requested), "request"), (normalize_language(preferred), "profile")) if code]
+    candidates, has_letters = script_candidates(text)
+
+    if not has_letters:
+        return (hints[0][0], hints[0][1]) if hints else ("en", "default")
+    if candidates is None:
+        return None, "ambiguous"
+
+    # Latin text is only trusted as English when the strongest hint agrees: a Hindi-preferring
+    # user typing in Latin script may well be writing Hinglish, but an explicit "en" on the
+    # request outranks the stored preference.
+    if candidates == LATIN and hints and hints[0][0] not in candidates:
+        return None, "ambiguous"
+
+    for code, source in hints:
+        if code in candidates:
+            return code, source
+
+    if len(candidates) == 1:
+        return next(iter(candidates)), "script"
+    return None, "ambiguous"
@@ -0,0 +1,216 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+import weakref
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Enable with LOOP_MONITOR_ENABLED=1. Threshold is how long a single callback may
+# hold the event loop before its stack is captured; interval is the heartbeat period.
+LOOP_MONITOR_ENABLED = os.getenv("LOOP_MONITOR_ENABLED", "0").lower() in ("1", "true", "yes")
+LOOP_MONITOR_THRESHOLD_MS = float(os.getenv("LOOP_MONITOR_THRESHOLD_MS", "100"))
+LOOP_MONITOR_INTERVAL_MS = float(os.getenv("LOOP_MONITOR_INTERVAL_MS", "20"))
+LOOP_MONITOR_MAX_OFFENDERS = int(os.getenv("LOOP_MONITOR_MAX_OFFENDERS", "200"))
+
+# Frames from these files never identify the real culprit, so they are skipped
+# when picking the "offending" frame from a captured stack.
+_IGNORED_FRAME_PARTS = (
+    os.sep + "asyncio" + os.sep,
+    os.sep + "threading.py",
+    os.sep + "selectors.py",
+    "loop_monitor.py",
+)
+
+
+class LoopMonitor:
+    """Watchdog that detects callbacks blocking the asyncio event loop.
+
+    A heartbeat coroutine on the loop stamps the time every interval. A daemon
+    thread checks the stamp; once it is older than the threshold, the loop thread
+    is stuck inside a single callback, so the thread grabs its stack with
+    ``sys._current_frames()`` and attributes it to the route being served.
+    """
+
+    def __init__(self, threshold_ms: float = LOOP_MONITOR_THRESHOLD_MS, interval_ms: float = LOOP_MONITOR_INTERVAL_MS):
+        self.threshold = threshold_ms / 1000
+        self.interval = interval_ms / 1000
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._last_beat = time.perf_counter()
+        self._lock = threading.Lock()
+        # task -> ASGI scope, so the watchdog can name the route that is blocking
+        self._task_scopes: "weakref.WeakKeyDictionary[asyncio.Task, dict]" = weakref.WeakKeyDictionary()
+        self._offenders: Dict[Tuple[str, str], Dict] = {}
+        self._lag_samples = 0
+        self._lag_total = 0.0
+        self._lag_max = 0.0
+        self._blocks_detected = 0
+
+    @property
+    def running(self) -> bool:
+        return self._heartbeat_task is not None and not self._heartbeat_task.done()
+
+    def start(self):
+        """Start the heartbeat and watchdog. Must be called from the event loop."""
+        if self.running:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._stop.clear()
+        self._last_beat = time.perf_counter()
+        self._heartbeat_task = self._loop.create_task(self._heartbeat())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-monitor", daemon=True)
+        self._watchdog.start()
+        logger.info(f"Loop monitor started (threshold={self.threshold * 1000:.0f}ms, interval={self.interval * 1000:.0f}ms)")
+
+    async def stop(self):
+        self._stop.set()
+        if self._heartbeat_task:
+            self._heartbeat_task.cancel()
+            try:
+                await self._heartbeat_task
+            except asyncio.CancelledError:
+                pass
+            self._heartbeat_task = None
+        if self._watchdog:
+            self._watchdog.join(timeout=1)
+            self._watchdog = None
+
+    def track_request(self, scope: dict):
+        """Associate the current task with an ASGI scope (called by the middleware)."""
+        task = asyncio.current_task()
+        if task is not None:
+            self._task_scopes[task] = scope
+
+    def untrack_request(self):
+        task = asyncio.current_task()
+        if task is not None:
+            self._task_scopes.pop(task, None)
+
+    async def _heartbeat(self):
+        while True:
+            expected = time.perf_counter() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.perf_counter()
+            lag = max(0.0, now - expected)
+            with self._lock:
+                self._last_beat = now
+                self._lag_samples += 1
+                self._lag_total += lag
+                self._lag_max = max(self._lag_max, lag)
+
+    def _watch(self):
+        reported_beat = None
+        while not self._stop.wait(self.interval):
+            with self._lock:
+                last_beat = self._last_beat
+            blocked_for = time.perf_counter() - last_beat
+            # Capture each stall once, while it is still happening
+            if blocked_for < self.threshold or reported_beat == last_beat:
+                continue
+            reported_beat = last_beat
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            stack = traceback.extract_stack(frame)
+            self._record(self._current_route(), stack, blocked_for)
+
+    def _current_route(self) -> str:
+        try:
+            task = asyncio.current_task(self._loop)
+        except RuntimeError:
+            task = None
+        scope = self._task_scopes.get(task) if task is not None else None
+        if scope is None:
+            return "<no request>"
+        # The router writes the matched route into the shared scope dict
+        route = scope.get("route")
+        path = getattr(route, "path", None) or scope.get("path", "?")
+        return f"{scope.get('method', '')} {path}".strip()
+
+    def _record(self, route: str, stack: traceback.StackSummary, blocked_for: float):
+        culprit = next(
+            (f for f in reversed(stack) if not any(part in f.filename for part in _IGNORED_FRAME_PARTS)),
+            stack[-1],
+        )
+        location = f"{culprit.filename}:{culprit.lineno} in {culprit.name}"
+        formatted = "".join(traceback.format_list(stack[-15:]))
+        logger.warning(
+            f"Event loop blocked for {blocked_for * 1000:.0f}ms+ on {route} at {location}\n{formatted}"
+        )
+        with self._lock:
+            self._blocks_detected += 1
+            key = (route, location)
+            entry = self._offenders.get(key)
+            if entry is None:
+                if len(self._offenders) >= LOOP_MONITOR_MAX_OFFENDERS:
+                    return
+                entry = self._offenders[key] = {
+                    "route": route,
+                    "location": location,
+                    "count": 0,
+                    "max_blocked_ms": 0.0,
+                    "total_blocked_ms": 0.0,
+                    "stack": formatted,
+                }
+            entry["count"] += 1
+            entry["total_blocked_ms"] += blocked_for * 1000
+            entry["max_blocked_ms"] = max(entry["max_blocked_ms"], blocked_for * 1000)
+            entry["last_seen"] = time.time()
+
+    def report(self) -> Dict:
+        """Aggregated offenders, worst first, plus overall loop lag statistics."""
+        with self._lock:
+            offenders: List[Dict] = sorted(
+                (dict(entry) for entry in self._offenders.values()),
+                key=lambda e: e["total_blocked_ms"],
+                reverse=True,
+            )
+            return {
+                "enabled": self.running,
+                "threshold_ms": self.threshold * 1000,
+                "blocks_detected": self._blocks_detected,
+                "lag": {
+                    "samples": self._lag_samples,
+                    "avg_ms": (self._lag_total / self._lag_samples * 1000) if self._lag_samples else 0.0,
+                    "max_ms": self._lag_max * 1000,
+                },
+                "offenders": offenders,
+            }
+
+    def reset(self):
+        with self._lock:
+            self._offenders.clear()
+            self._lag_samples = 0
+            self._lag_total = 0.0
+            self._lag_max = 0.0
+            self._blocks_detected = 0
+
+
+class LoopMonitorMiddleware:
+    """ASGI middleware that lets the monitor attribute stalls to a route."""
+
+    def __init__(self, app, monitor: "LoopMonitor"):
+        self.app = app
+        self.monitor = monitor
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        self.monitor.track_request(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.monitor.untrack_request()
+
+
+loop_monitor = LoopMonitor()
@@ -0,0 +1,105 @@
+import csv
+import io
+import json
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set
+from fastapi import Request
+from fastapi.responses import JSONResponse, Response
+
+# Both encoders are optional: without orjson we fall back to the stdlib, without msgpack we only speak JSON
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack")
+
+# Rows per chunk when streaming NDJSON/CSV: large enough to amortise the writes, small enough to start fast
+STREAM_BATCH_ROWS = 500
+
+# Heavy or diagnostic keys that lean clients skip; audio is fetched from audio_url instead
+LEAN_EXCLUDED_FIELDS = ("sources", "audio_response")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson when it is installed"""
+
+    def render(self, content: Any) -> bytes:
+        if orjson is None:
+            return super().render(content)
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+
+
+class MsgPackResponse(Response):
+    media_type = MSGPACK_MEDIA_TYPES[0]
+
+    def render(self, content: Any) -> bytes:
+        return msgpack.packb(content, use_bin_type=True, default=str)
+
+
+def accepts_msgpack(request: Request) -> bool:
+    accept = request.headers.get("accept", "").lower()
+    return msgpack is not None and any(media_type in accept for media_type in MSGPACK_MEDIA_TYPES)
+
+
+def negotiated_response(request: Request, content: Any, status_code: int = 200, headers: Optional[Dict[str, str]] = None) -> Response:
+    """msgpack when the client asks for it in Accept, JSON (orjson if available) otherwise"""
+    response_class = MsgPackResponse if accepts_msgpack(request) else FastJSONResponse
+    response = response_class(content=content, status_code=status_code, headers=headers)
+    response.headers["Vary"] = "Accept"
+    return response
+
+
+def parse_fields(fields: Optional[str]) -> Optional[Set[str]]:
+    """'response,recommendations' -> {'response', 'recommendations'}; None/empty means all fields"""
+    selected = {field.strip() for field in (fields or "").split(",") if field.strip()}
+    return selected or None
+
+
+def include_field(name: str, fields: Optional[Set[str]] = None, lean: bool = False) -> bool:
+    if fields is not None:
+        return name in fields
+    return not (lean and name in LEAN_EXCLUDED_FIELDS)
+
+
+def shape_response(content: Dict, fields: Optional[Set[str]] = None, lean: bool = False, always: Iterable[str] = ("error",)) -> Dict:
+    """Keep only the requested fields (plus `always`), or drop LEAN_EXCLUDED_FIELDS in lean mode"""
+    always = set(always)
+    return {key: value for key, value in content.items() if key in always or include_field(key, fields, lean)}
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is None:
+        return json.dumps(content, separators=(",", ":"), default=str).encode()
+    return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+
+
+def ndjson_chunks(rows: Iterable[Dict], batch: int = STREAM_BATCH_ROWS) -> Iterator[bytes]:
+    """One JSON object per line, yielded in batches for a StreamingResponse"""
+    lines: List[bytes] = []
+    for row in rows:
+        lines.append(dumps(row))
+        if len(lines) >= batch:
+            yield b"\n".join(lines) + b"\n"
+            lines = []
+    if lines:
+        yield b"\n".join(lines) + b"\n"
+
+
+def csv_chunks(rows: Iterable[Dict], columns: List[str], batch: int = STREAM_BATCH_ROWS) -> Iterator[bytes]:
+    """Header plus one line per row (only `columns`, in that order), yielded in batches"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction="ignore", lineterminator="\n")
+    writer.writeheader()
+    for count, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if count % batch == 0:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
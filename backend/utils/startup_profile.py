@@ -0,0 +1,152 @@
+import builtins
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Record per-module import times (wraps __import__, so only enable when investigating boot time)
+STARTUP_PROFILE = os.getenv("STARTUP_PROFILE", "0").lower() in ("1", "true", "yes")
+# Boot budget: process start -> application ready to serve, in ms (0 disables the check)
+STARTUP_BUDGET_MS = float(os.getenv("STARTUP_BUDGET_MS", "0"))
+# Fail startup instead of only logging when the budget is exceeded (for CI / deploy checks)
+STARTUP_BUDGET_ENFORCE = os.getenv("STARTUP_BUDGET_ENFORCE", "0").lower() in ("1", "true", "yes")
+STARTUP_PROFILE_TOP = int(os.getenv("STARTUP_PROFILE_TOP", "25"))
+
+
+def _process_started() -> float:
+    """Wall-clock time the process started (Linux), falling back to 'now' elsewhere"""
+    try:
+        with open("/proc/self/stat") as f:
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return time.time() - uptime + start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return time.time()
+
+
+class StartupProfiler:
+    """
+    Boot timings: optional per-module import times, named lifespan phases, and a
+    boot budget checked once the app is ready.
+
+    Import timing mirrors `python -X importtime`: each first-time import gets
+    its cumulative time and its self time (minus nested imports). Imports after
+    boot are still recorded (phase "runtime"), which shows what lazy modules
+    the first requests pulled in.
+    """
+
+    def __init__(self):
+        self.process_started = _process_started()
+        self.imports: Dict[str, Dict] = {}
+        self.phases: List[Dict] = []
+        self.ready_at: Optional[float] = None
+        # Context-local so overlapping background phases (asyncio tasks, to_thread) label their own imports
+        self._phase: ContextVar[Optional[str]] = ContextVar("startup_phase", default=None)
+        # Nested-import bookkeeping per thread (the dataset loads in a worker thread)
+        self._local = threading.local()
+        self._original_import = None
+
+    @property
+    def current_phase(self) -> str:
+        return self._phase.get() or ("runtime" if self.ready_at else "import")
+
+    def since_start_ms(self, at: Optional[float] = None) -> float:
+        return round(((at or time.time()) - self.process_started) * 1000, 1)
+
+    def install(self):
+        """Start timing imports; call as early as possible (first import in main.py)"""
+        if self._original_import is not None:
+            return
+        self._original_import = original = builtins.__import__
+        profiler = self
+
+        def timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+            if level or name in sys.modules:
+                return original(name, globals, locals, fromlist, level)
+            stack = profiler._local.__dict__.setdefault("stack", [])
+            stack.append([0.0])
+            start = time.perf_counter()
+            try:
+                return original(name, globals, locals, fromlist, level)
+            finally:
+                elapsed = time.perf_counter() - start
+                nested = stack.pop()[0]
+                if stack:
+                    stack[-1][0] += elapsed
+                if name not in profiler.imports:
+                    profiler.imports[name] = {
+                        "module": name,
+                        "cumulative_ms": round(elapsed * 1000, 2),
+                        "self_ms": round((elapsed - nested) * 1000, 2),
+                        "phase": profiler.current_phase,
+                    }
+
+        builtins.__import__ = timed_import
+
+    def uninstall(self):
+        if self._original_import is not None:
+            builtins.__import__ = self._original_import
+            self._original_import = None
+
+    @contextmanager
+    def phase(self, name: str):
+        """Time a startup phase (database, knowledge index, ...)"""
+        token = self._phase.set(name)
+        started = time.time()
+        try:
+            yield
+        finally:
+            self._phase.reset(token)
+            self.phases.append({
+                "phase": name,
+                "started_ms": self.since_start_ms(started),
+                "duration_ms": round((time.time() - started) * 1000, 1),
+            })
+
+    def mark_ready(self):
+        """Application is serving; checks the boot budget"""
+        self.ready_at = time.time()
+        boot_ms = self.since_start_ms(self.ready_at)
+        logger.info(f"Startup took {boot_ms:.0f}ms")
+        if STARTUP_PROFILE:
+            for entry in self.top_imports(10):
+                logger.info(f"  import {entry['module']}: {entry['cumulative_ms']:.0f}ms")
+        if STARTUP_BUDGET_MS and boot_ms > STARTUP_BUDGET_MS:
+            message = f"Startup took {boot_ms:.0f}ms, over the {STARTUP_BUDGET_MS:.0f}ms budget"
+            if STARTUP_BUDGET_ENFORCE:
+                raise RuntimeError(message)
+            logger.warning(message)
+
+    def top_imports(self, limit: int = STARTUP_PROFILE_TOP) -> List[Dict]:
+        return sorted(self.imports.values(), key=lambda entry: entry["cumulative_ms"], reverse=True)[:limit]
+
+    def report(self) -> Dict:
+        boot_ms = self.since_start_ms(self.ready_at) if self.ready_at else None
+        return {
+            "profiling_imports": STARTUP_PROFILE,
+            "boot_ms": boot_ms,
+            "budget_ms": STARTUP_BUDGET_MS or None,
+            "over_budget": bool(STARTUP_BUDGET_MS and boot_ms and boot_ms > STARTUP_BUDGET_MS),
+            "phases": list(self.phases),
+            "slowest_imports": self.top_imports(),
+            "runtime_imports": [entry for entry in self.imports.values() if entry["phase"] == "runtime"],
+            "heavy_modules_loaded": {
+                module: module in sys.modules
+                for module in ("google.generativeai", "openai", "googletrans", "gtts", "pandas", "numpy")
+            },
+        }
+
+
+startup_profiler = StartupProfiler()
+if STARTUP_PROFILE:
+    startup_profiler.install()
@@ -0,0 +1,222 @@
+import json
+import logging
+from typing import Any, Dict, List, Optional, Tuple, Type
+from pydantic import BaseModel, ValidationError, create_model
+
+logger = logging.getLogger(__name__)
+
+_decoder = json.JSONDecoder()
+
+
+def _closers(stack: List[str]) -> str:
+    return "".join("}" if opener == "{" else "]" for opener in reversed(stack))
+
+
+def parse_partial_json(text: Optional[str]) -> Optional[Any]:
+    """
+    Best-effort parse of JSON that may be wrapped in prose/markdown fences or cut off mid-stream.
+
+    Complete documents are decoded directly. Truncated ones are closed at the
+    last point where every open string, array and object can be terminated
+    validly: an unfinished string value is kept (so a half-streamed
+    "description" is still usable), while dangling keys, commas and partial
+    numbers/literals are dropped. Returns None if nothing can be recovered.
+    """
+    if not text:
+        return None
+    starts = [i for i in (text.find("{"), text.find("[")) if i != -1]
+    if not starts:
+        return None
+    s = text[min(starts):]
+    try:
+        return _decoder.raw_decode(s)[0]
+    except json.JSONDecodeError:
+        pass
+
+    stack: List[str] = []
+    expect_key = False
+    in_string = string_is_key = escape = False
+    checkpoint: Optional[Tuple[int, str]] = None
+    i, n = 0, len(s)
+    while i < n:
+        ch = s[i]
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+                if not string_is_key:
+                    checkpoint = (i + 1, _closers(stack))
+            i += 1
+            continue
+        if ch == '"':
+            in_string, escape = True, False
+            string_is_key = bool(stack) and stack[-1] == "{" and expect_key
+        elif ch in "{[":
+            stack.append(ch)
+            expect_key = ch == "{"
+            checkpoint = (i + 1, _closers(stack))
+        elif ch in "}]":
+            if stack:
+                stack.pop()
+            checkpoint = (i + 1, _closers(stack))
+            expect_key = False
+            if not stack:
+                break
+        elif ch == ":":
+            expect_key = False
+        elif ch == ",":
+            expect_key = bool(stack) and stack[-1] == "{"
+        elif ch.isalnum() or ch in "-+.":
+            # number or true/false/null; only complete if something follows it
+            j = i
+            while j < n and (s[j].isalnum() or s[j] in "-+."):
+                j += 1
+            if j < n:
+                checkpoint = (j, _closers(stack))
+            i = j
+            continue
+        i += 1
+
+    candidates = []
+    if in_string and not string_is_key:
+        body = s[:-1] if escape else s
+        candidates.append(body + '"' + _closers(stack))
+    if checkpoint is not None:
+        candidates.append(s[:checkpoint[0]] + checkpoint[1])
+    for candidate in candidates:
+        try:
+            return json.loads(candidate)
+        except json.JSONDecodeError:
+            continue
+    return None
+
+
+class StructuredStream:
+    """Accumulates streamed LLM text so fields can be read before (or without) the stream finishing."""
+
+    def __init__(self):
+        self.chunks: List[str] = []
+        self.finished = False
+
+    def feed(self, chunk: str):
+        if chunk:
+            self.chunks.append(chunk)
+
+    @property
+    def text(self) -> str:
+        return "".join(self.chunks)
+
+    def partial(self) -> Optional[Dict]:
+        data = parse_partial_json(self.text)
+        return data if isinstance(data, dict) else None
+
+
+def validate_structured(schema: Type[BaseModel], data: Any) -> Tuple[Optional[BaseModel], List[str]]:
+    """
+    Validate LLM output against `schema`.
+
+    Returns (instance, missing): `missing` lists fields the model did not
+    supply or supplied in an invalid shape. Invalid optional fields fall back
+    to their defaults, so an instance is returned whenever the required
+    fields are usable.
+    """
+    if not isinstance(data, dict):
+        return None, list(schema.model_fields)
+    missing = [name for name in schema.model_fields if name not in data]
+    try:
+        return schema.model_validate(data), missing
+    except ValidationError as e:
+        invalid = {str(error["loc"][0]) for error in e.errors() if error["loc"]}
+    cleaned = {key: value for key, value in data.items() if key not in invalid}
+    missing += sorted(invalid - set(missing))
+    try:
+        return schema.model_validate(cleaned), missing
+    except ValidationError:
+        return None, missing
+
+
+def gemini_schema(schema: Type[BaseModel], fields: Optional[List[str]] = None) -> Dict:
+    """Gemini response_schema (OpenAPI subset) for a flat pydantic model, optionally limited to some fields"""
+    json_schema = schema.model_json_schema()
+    properties = {}
+    for name, prop in json_schema.get("properties", {}).items():
+        if fields is not None and name not in fields:
+            continue
+        nullable = False
+        if "anyOf" in prop:
+            options = [option for option in prop["anyOf"] if option.get("type") != "null"]
+            nullable = len(options) < len(prop["anyOf"])
+            prop = dict(prop, **options[0]) if options else prop
+        converted = {"type": prop.get("type", "string")}
+        if "items" in prop:
+            converted["items"] = {"type": prop["items"].get("type", "string")}
+        if prop.get("description"):
+            converted["description"] = prop["description"]
+        if nullable:
+            converted["nullable"] = True
+        properties[name] = converted
+    return {
+        "type": "object",
+        "properties": properties,
+        "required": [name for name in json_schema.get("required", []) if name in properties],
+    }
+
+
+def json_generation_config(schema: Type[BaseModel], fields: Optional[List[str]] = None, max_output_tokens: Optional[int] = None) -> Dict:
+    config = {"response_mime_type": "application/json", "response_schema": gemini_schema(schema, fields)}
+    if max_output_tokens:
+        config["max_output_tokens"] = max_output_tokens
+    return config
+
+
+async def generate_structured(model, prompt: str, schema: Type[BaseModel], stream: Optional[StructuredStream] = None, fields: Optional[List[str]] = None) -> str:
+    """
+    Ask Gemini for JSON matching `schema` (JSON mode + response schema), streaming into `stream`.
+
+    If the caller times out mid-generation, whatever arrived so far is still
+    available from stream.partial().
+    """
+    stream = stream if stream is not None else StructuredStream()
+    response = await model.generate_content_async(
+        prompt,
+        generation_config=json_generation_config(schema, fields),
+        stream=True,
+    )
+    async for chunk in response:
+        try:
+            stream.feed(chunk.text)
+        except ValueError:
+            # chunk without text parts (e.g. safety-blocked); nothing to add
+            continue
+    stream.finished = True
+    return stream.text
+
+
+async def repair_missing_fields(model, schema: Type[BaseModel], partial: Dict, missing: List[str], task: str) -> Dict:
+    """
+    Cheap follow-up call asking only for the fields the first answer lacked.
+
+    Returns a dict containing just the repaired fields (empty on failure).
+    """
+    if not missing:
+        return {}
+    patch_model = create_model(
+        f"{schema.__name__}Patch",
+        **{name: (schema.model_fields[name].annotation, ...) for name in missing if name in schema.model_fields},
+    )
+    prompt = (
+        f"{task}\n\nA previous answer was incomplete:\n{json.dumps(partial, ensure_ascii=False)}\n\n"
+        f"Return only JSON with these fields, consistent with that answer: {', '.join(missing)}."
+    )
+    try:
+        response = await model.generate_content_async(
+            prompt, generation_config=json_generation_config(schema, fields=missing, max_output_tokens=256)
+        )
+        patch, _ = validate_structured(patch_model, parse_partial_json(response.text))
+        return patch.model_dump() if patch is not None else {}
+    except Exception as e:
+        logger.error(f"Structured output repair failed: {str(e)}")
+        return {}